@@ -0,0 +1,148 @@
+"""
+Admission control for the CPU-heavy routes.
+
+Each route class (predict, upload, export, auth) has its own limit of requests
+running at once on a worker and a bounded FIFO of requests waiting for a slot,
+both set in config.Settings (ADMISSION_<CLASS>_LIMIT / _QUEUE). A request that
+finds the queue full gets 429 at once; one that waits longer than
+ADMISSION_QUEUE_TIMEOUT_SECONDS gets 503. Both carry Retry-After, estimated from
+the recent service time of the class, so cheap routes like /students/ keep their
+latency while heavy work is shed.
+
+Routes opt in with a dependency, which holds the slot until the response
+(including a streamed body) has been sent:
+
+    @router.get("/predict", dependencies=[Depends(admission.admit("predict"))])
+
+Background work started by a request (prediction jobs) takes a slot with hold()
+instead, without queueing, and keeps it until the work finishes.
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Callable, Dict
+from fastapi import HTTPException
+from . import metrics
+from .config import settings
+
+MAX_RETRY_AFTER = 120  # seconds
+
+
+class Limiter:
+    """At most limit holders and queue waiters; limit 0 disables the class."""
+
+    def __init__(self, name: str, limit: int, queue: int, timeout: float):
+        self.name = name
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self.active = 0
+        self._waiters: deque = deque()
+        self._service_seconds = 1.0  # moving average of how long a slot is held
+
+    def _publish(self) -> None:
+        metrics.ADMISSION_IN_FLIGHT.set(self.active, self.name)
+        metrics.ADMISSION_QUEUE_DEPTH.set(len(self._waiters), self.name)
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue has likely drained."""
+        wait = self._service_seconds * (len(self._waiters) + 1) / max(self.limit, 1)
+        return min(MAX_RETRY_AFTER, max(1, math.ceil(wait)))
+
+    def _reject(self, status_code: int, reason: str, detail: str) -> HTTPException:
+        metrics.ADMISSION_REJECTED.inc(1, self.name, reason)
+        return HTTPException(status_code=status_code, detail=detail, headers={"Retry-After": str(self.retry_after())})
+
+    async def acquire(self) -> None:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self._publish()
+            return
+        if len(self._waiters) >= self.queue:
+            raise self._reject(429, "queue_full", f"Too many concurrent {self.name} requests, retry later")
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        self._publish()
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(fut, self.timeout)
+        except BaseException as exc:
+            if fut.done() and not fut.cancelled():
+                # the slot was handed over just as we gave up: pass it on
+                self.release()
+            if isinstance(exc, asyncio.TimeoutError):
+                raise self._reject(503, "timeout", f"Server busy with {self.name} requests, retry later")
+            raise
+        finally:
+            try:
+                self._waiters.remove(fut)
+            except ValueError:
+                pass
+            metrics.ADMISSION_WAIT.observe(time.perf_counter() - start, self.name)
+            self._publish()
+
+    def acquire_nowait(self) -> None:
+        """Take a free slot at once or raise 429; never queues."""
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self._publish()
+            return
+        raise self._reject(429, "queue_full", f"Too many concurrent {self.name} requests, retry later")
+
+    def release(self, held_seconds: float = None) -> None:
+        if held_seconds is not None:
+            self._service_seconds += 0.2 * (held_seconds - self._service_seconds)
+        # hand the slot straight to the oldest waiter, so new arrivals cannot overtake
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                self._publish()
+                return
+        self.active -= 1
+        self._publish()
+
+
+def _limiter(name: str) -> Limiter:
+    return Limiter(
+        name,
+        getattr(settings, f"ADMISSION_{name.upper()}_LIMIT"),
+        getattr(settings, f"ADMISSION_{name.upper()}_QUEUE"),
+        settings.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+    )
+
+
+limiters: Dict[str, Limiter] = {name: _limiter(name) for name in ("predict", "upload", "export", "auth")}
+
+
+def hold(name: str) -> Callable[[], None]:
+    """
+    Take a slot of route class name for work that outlives the request; returns
+    the function that gives it back. Raises 429 when no slot is free.
+    """
+    limiter = limiters[name]
+    if not limiter.limit:
+        return lambda: None
+    limiter.acquire_nowait()
+    start = time.perf_counter()
+    return lambda: limiter.release(time.perf_counter() - start)
+
+
+def admit(name: str):
+    """Dependency that holds a slot of route class name for the whole request."""
+    limiter = limiters[name]
+
+    async def dependency():
+        if not limiter.limit:
+            yield
+            return
+        await limiter.acquire()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            limiter.release(time.perf_counter() - start)
+
+    return dependency
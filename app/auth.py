@@ -1,5 +1,8 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Iterable, Optional
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
@@ -8,16 +11,51 @@ from .config import settings
 from .schemas import TokenData
 from sqlalchemy.ext.asyncio import AsyncSession
 from .crud import get_user_by_username
+from .cache import TTLCache
+from . import metrics
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
+# bcrypt releases the GIL, so a few dedicated threads keep it off the event loop
+# without letting a login burst take over the default threadpool
+_bcrypt_executor = ThreadPoolExecutor(max_workers=settings.BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+# decoded tokens, never kept past their own exp
+_token_cache = TTLCache(maxsize=settings.TOKEN_CACHE_SIZE, ttl=settings.TOKEN_CACHE_TTL_SECONDS)
+
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
 
 def verify_password(plain: str, hashed: str) -> bool:
     return pwd_context.verify(plain, hashed)
 
+def _timed_bcrypt(op: str, fn, *args):
+    metrics.EXECUTOR_QUEUE_DEPTH.dec(1, "bcrypt")
+    with metrics.BCRYPT_LATENCY.time(op):
+        return fn(*args)
+
+async def _run_bcrypt(op: str, fn, *args):
+    loop = asyncio.get_running_loop()
+    metrics.EXECUTOR_QUEUE_DEPTH.inc(1, "bcrypt")
+    return await loop.run_in_executor(_bcrypt_executor, _timed_bcrypt, op, fn, *args)
+
+async def hash_password_async(password: str) -> str:
+    return await _run_bcrypt("hash", hash_password, password)
+
+async def verify_password_async(plain: str, hashed: str) -> bool:
+    return await _run_bcrypt("verify", verify_password, plain, hashed)
+
+def benchmark_bcrypt_rounds(rounds: Iterable[int] = range(10, 15), samples: int = 3) -> Dict[int, float]:
+    """Milliseconds per bcrypt hash for each cost factor, to pick BCRYPT_ROUNDS on this hardware."""
+    results = {}
+    for r in rounds:
+        ctx = CryptContext(schemes=["bcrypt"], bcrypt__rounds=r)
+        start = time.perf_counter()
+        for _ in range(samples):
+            ctx.hash("benchmark-password")
+        results[r] = (time.perf_counter() - start) / samples * 1000
+    return results
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES))
@@ -32,6 +70,9 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    token_data = _token_cache.get(token)
+    if token_data is not None:
+        return token_data
     try:
         payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
         username: str = payload.get("sub")
@@ -41,8 +82,15 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
         token_data = TokenData(username=username, role=role)
     except JWTError:
         raise credentials_exception
+    exp = payload.get("exp")
+    if exp is not None:
+        _token_cache.set(token, token_data, ttl=exp - time.time())
     return token_data
 
 def ensure_role(token_data: TokenData, allowed_roles: list[str]):
     if token_data.role not in allowed_roles:
         raise HTTPException(status_code=403, detail="Insufficient permissions")
+
+if __name__ == "__main__":
+    for r, ms in benchmark_bcrypt_rounds().items():
+        print(f"bcrypt rounds={r}: {ms:.1f} ms/hash")
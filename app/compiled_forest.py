@@ -0,0 +1,217 @@
+"""
+Flat-array form of the trained StandardScaler + RandomForest pipeline.
+
+compile_pipeline() copies the scaler parameters and every tree into a handful of
+NumPy arrays (all trees concatenated, node ids made global). CompiledForest
+walks all (tree, row) pairs at once, one vectorized step per tree level, and
+gives the same predict_proba as the sklearn pipeline: features are scaled with
+the same float32/float64 rounding as StandardScaler and cast to float32 before
+the threshold comparisons, exactly as sklearn's trees see them.
+
+save() writes one .npy per array; load() maps them read-only (mmap), so every
+worker process on a host shares one copy through the page cache and starts
+without unpickling any estimator. Small batches (a mentor opening one student)
+are several times faster than the sklearn pipeline; past a few hundred rows the
+Cython trees win, so batches larger than max_rows go to the joblib pipeline,
+loaded on first use.
+
+explain() also returns per-feature contributions (tree-path / Saabas) to a
+weighted sum of the class probabilities, from the same leaves as predict_proba:
+a per-node contribution table is built once per weights, after which explaining
+a batch costs one extra gather over the leaf ids.
+"""
+
+import json
+import os
+from typing import Dict, Optional
+import joblib
+import numpy as np
+
+ARRAYS = ("mean", "scale", "feature", "threshold", "left", "right", "value", "roots")
+META_FILE = "forest.json"
+ROW_BLOCK = 4096  # rows evaluated together; bounds the (trees x rows) node-index matrix
+
+
+def compile_pipeline(pipe) -> Dict[str, np.ndarray]:
+    """Arrays for a Pipeline of an optional StandardScaler followed by a RandomForestClassifier."""
+    steps = [est for _, est in pipe.steps] if hasattr(pipe, "steps") else [pipe]
+    forest = steps[-1]
+    scaler = steps[0] if len(steps) == 2 else None
+    if len(steps) > 2 or not hasattr(forest, "estimators_") or (scaler is not None and not hasattr(scaler, "scale_")):
+        raise TypeError("only [StandardScaler +] RandomForestClassifier pipelines can be compiled")
+    if forest.n_outputs_ != 1:
+        raise TypeError("multi-output forests are not supported")
+    n_features = forest.n_features_in_
+    mean = getattr(scaler, "mean_", None)
+    scale = getattr(scaler, "scale_", None)
+    feature, threshold, left, right, value, roots = [], [], [], [], [], []
+    offset = 0
+    for est in forest.estimators_:
+        t = est.tree_
+        ids = np.arange(t.node_count, dtype=np.int64) + offset
+        leaf = t.children_left == -1
+        # leaves point at themselves, so extra steps past a leaf are no-ops
+        feature.append(np.where(leaf, 0, t.feature))
+        threshold.append(np.where(leaf, 0.0, t.threshold))
+        left.append(np.where(leaf, ids, t.children_left + offset))
+        right.append(np.where(leaf, ids, t.children_right + offset))
+        v = t.value[:, 0, :forest.n_classes_]
+        norm = v.sum(axis=1, keepdims=True)
+        norm[norm == 0.0] = 1.0
+        value.append(v / norm)
+        roots.append(offset)
+        offset += t.node_count
+    return {
+        "mean": np.zeros(n_features) if mean is None else np.asarray(mean, dtype=np.float64),
+        "scale": np.ones(n_features) if scale is None else np.asarray(scale, dtype=np.float64),
+        "feature": np.concatenate(feature).astype(np.int32),
+        "threshold": np.concatenate(threshold).astype(np.float64),
+        "left": np.concatenate(left).astype(np.int32),
+        "right": np.concatenate(right).astype(np.int32),
+        "value": np.concatenate(value).astype(np.float64),
+        "roots": np.asarray(roots, dtype=np.int32),
+        "classes": np.asarray(forest.classes_),
+        "max_depth": max(est.tree_.max_depth for est in forest.estimators_),
+    }
+
+
+class CompiledForest:
+    """predict_proba over compiled arrays; a drop-in for the sklearn pipeline when scoring."""
+
+    def __init__(self, arrays: Dict[str, np.ndarray], classes, max_depth: int,
+                 pipeline_path: Optional[str] = None, max_rows: Optional[int] = None):
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+        self.classes_ = np.asarray(classes)
+        self.max_depth = int(max_depth)
+        self.n_features_in_ = len(self.mean)
+        self.is_leaf = self.left == np.arange(len(self.left))
+        # large batches are handed to the sklearn pipeline at pipeline_path
+        self.pipeline_path = pipeline_path
+        self.max_rows = max_rows
+        self._pipeline = None
+
+    @classmethod
+    def from_pipeline(cls, pipe, max_rows: Optional[int] = None) -> "CompiledForest":
+        """Compile pipe in memory; with max_rows, larger batches go back to pipe itself."""
+        a = compile_pipeline(pipe)
+        forest = cls(a, a["classes"], a["max_depth"], max_rows=max_rows)
+        forest._pipeline = pipe
+        return forest
+
+    def _use_pipeline(self, n_rows: int) -> bool:
+        has_pipeline = self.pipeline_path is not None or self._pipeline is not None
+        return has_pipeline and self.max_rows is not None and n_rows > self.max_rows
+
+    def leaves(self, X) -> np.ndarray:
+        """Global leaf id reached in every tree: shape (n_trees, n_rows)."""
+        X = np.asarray(X)
+        if X.dtype == np.float32:
+            # StandardScaler.transform keeps float32 input in float32, rounding after each step
+            Xs = ((X - self.mean).astype(np.float32) / self.scale).astype(np.float32)
+        else:
+            # StandardScaler.transform, then the float32 cast sklearn trees apply
+            Xs = ((np.asarray(X, dtype=np.float64) - self.mean) / self.scale).astype(np.float32)
+        n_rows, n_features = Xs.shape
+        flat = Xs.ravel()
+        # one entry per (tree, row) pair; pairs drop out as they reach a leaf
+        node = np.repeat(self.roots.astype(np.int64), n_rows)
+        out = node.copy()
+        pos = np.flatnonzero(~self.is_leaf[node])
+        node = node[pos]
+        base = np.tile(np.arange(n_rows, dtype=np.int64) * n_features, len(self.roots))[pos]
+        while pos.size:
+            go_left = flat[base + self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+            done = self.is_leaf[node]
+            if done.any():
+                out[pos[done]] = node[done]
+                keep = ~done
+                node, pos, base = node[keep], pos[keep], base[keep]
+        return out.reshape(len(self.roots), n_rows)
+
+    def _pipeline_leaves(self, X) -> np.ndarray:
+        # sklearn's own traversal (Cython) for large batches; local node ids made global
+        pipe = self.pipeline()
+        steps = [est for _, est in pipe.steps] if hasattr(pipe, "steps") else [pipe]
+        Xs = steps[0].transform(X) if len(steps) == 2 else X
+        return steps[-1].apply(Xs).T + self.roots[:, None]
+
+    def contributions_table(self, weights) -> np.ndarray:
+        """
+        Per node, the contribution of each feature to value @ weights along the path
+        from the root (Saabas): every split adds score(child) - score(parent) to the
+        feature it tests. Built level by level and cached per weights.
+        """
+        key = tuple(float(w) for w in weights)
+        cached = getattr(self, "_contrib", None)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        score = self.value @ np.asarray(weights, dtype=np.float64)
+        table = np.zeros((len(self.left), self.n_features_in_))
+        frontier = self.roots.astype(np.int64)
+        while frontier.size:
+            internal = frontier[~self.is_leaf[frontier]]
+            feature = self.feature[internal]
+            children = []
+            for child in (self.left[internal], self.right[internal]):
+                table[child] = table[internal]
+                table[child, feature] += score[child] - score[internal]
+                children.append(child)
+            frontier = np.concatenate(children)
+        table = table.astype(np.float32)
+        self._contrib = (key, table, score[self.roots].mean())
+        return table
+
+    def explain(self, X, weights):
+        """
+        predict_proba plus the per-feature contributions to proba @ weights, from one
+        pass over the trees: (proba, contributions (n_rows, n_features), bias), where
+        bias + contributions.sum(axis=1) == proba @ weights up to float rounding.
+        """
+        X = np.asarray(X)
+        table = self.contributions_table(weights)
+        bias = self._contrib[2]
+        proba = np.empty((len(X), self.value.shape[1]))
+        contrib = np.empty((len(X), self.n_features_in_))
+        large = self._use_pipeline(len(X))
+        for i in range(0, len(X), ROW_BLOCK):
+            block = X[i:i + ROW_BLOCK]
+            leaves = self._pipeline_leaves(block) if large else self.leaves(block)
+            proba[i:i + ROW_BLOCK] = self.value[leaves].sum(axis=0) / len(self.roots)
+            contrib[i:i + ROW_BLOCK] = table[leaves].sum(axis=0, dtype=np.float64) / len(self.roots)
+        return proba, contrib, bias
+
+    def pipeline(self):
+        if self._pipeline is None:
+            self._pipeline = joblib.load(self.pipeline_path)
+        return self._pipeline
+
+    def predict_proba(self, X) -> np.ndarray:
+        X = np.asarray(X)
+        if self._use_pipeline(len(X)):
+            return self.pipeline().predict_proba(X)
+        out = np.empty((len(X), self.value.shape[1]))
+        for i in range(0, len(X), ROW_BLOCK):
+            leaves = self.leaves(X[i:i + ROW_BLOCK])
+            out[i:i + ROW_BLOCK] = self.value[leaves].sum(axis=0) / len(self.roots)
+        return out
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    def save(self, path: str) -> None:
+        os.makedirs(path, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(path, META_FILE), "w") as f:
+            json.dump({"classes": self.classes_.tolist(), "max_depth": self.max_depth}, f)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True, pipeline_path: Optional[str] = None,
+             max_rows: Optional[int] = None) -> "CompiledForest":
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        mode = "r" if mmap else None
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode) for name in ARRAYS}
+        return cls(arrays, meta["classes"], meta["max_depth"], pipeline_path, max_rows)
@@ -1,11 +1,19 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy.sql import Select
+from sqlalchemy import select, func, delete, insert, and_, case
+from sqlalchemy.dialects import postgresql, sqlite
 from . import models
 from .schemas import UserCreate, StudentCreate, StudentRecordIn
 from typing import Optional, List
 from sqlalchemy.exc import NoResultFound
 import datetime
 
+_UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+def dialect_insert(db: AsyncSession):
+    """INSERT construct with ON CONFLICT support for the session's dialect, or None."""
+    return _UPSERT_INSERTS.get(db.get_bind().dialect.name)
+
 # User CRUD
 async def create_user(db: AsyncSession, user: UserCreate, hashed_password: str) -> models.User:
     db_user = models.User(
@@ -68,14 +76,191 @@ async def add_student_record(db: AsyncSession, record: StudentRecordIn) -> model
     await db.refresh(sr)
     return sr
 
-async def list_students(db: AsyncSession, limit: int = 100) -> List[models.Student]:
-    q = select(models.Student).limit(limit)
-    res = await db.execute(q)
+def students_query(after_id: Optional[int] = None) -> Select:
+    """Students in id order, starting after the keyset cursor after_id."""
+    q = select(models.Student).order_by(models.Student.id)
+    if after_id is not None:
+        q = q.where(models.Student.id > after_id)
+    return q
+
+async def list_students(db: AsyncSession, limit: int = 100, after_id: Optional[int] = None) -> List[models.Student]:
+    res = await db.execute(students_query(after_id).limit(limit))
     return res.scalars().all()
 
+async def stream_students(db: AsyncSession, after_id: Optional[int] = None, batch_size: int = 1000):
+    """Server-side cursor over students; rows are fetched batch_size at a time."""
+    q = students_query(after_id).execution_options(yield_per=batch_size)
+    return await db.stream_scalars(q)
+
 async def create_prediction(db: AsyncSession, student_id: int, risk_score: float, risk_label: str, details: dict) -> models.Prediction:
     p = models.Prediction(student_id=student_id, risk_score=risk_score, risk_label=risk_label, details=details)
     db.add(p)
     await db.commit()
     await db.refresh(p)
     return p
+
+def feature_rows_query() -> Select:
+    """
+    One compact student_features row per student: its latest record's values (as
+    defined by feature_store.fold_records) plus the running aggregates.
+    """
+    f = models.StudentFeature
+    return select(
+        f.student_id.label("student_pk"), models.Student.student_id, models.Student.name,
+        f.last_record_id.label("record_id"), f.latest_date.label("date"), f.attendance,
+        f.attendance_avg, f.test_score, f.prev_test_score, f.attempts, f.attempts_total,
+        f.fee_paid, f.fee_due_date,
+    ).join(models.Student, models.Student.id == f.student_id)
+
+def training_rows_query() -> Select:
+    """
+    Every StudentRecord with the previous test score of the same student (LAG over
+    record history, undated records first), for building training sets. The record
+    a student's current Prediction was computed from (its watermark's
+    last_record_id) also carries that prediction's label and scoring time; other
+    records get NULL there, since no stored prediction was computed from them.
+    """
+    sr = models.StudentRecord
+    p = models.Prediction
+    w = models.ScoringWatermark
+    prev = func.lag(sr.test_score).over(
+        partition_by=sr.student_id,
+        order_by=(sr.date.asc().nulls_first(), sr.id.asc()),
+    ).label("prev_test_score")
+    return (
+        select(
+            sr.id.label("record_id"), sr.student_id.label("student_pk"), sr.date, sr.attendance,
+            sr.test_score, prev, sr.attempts, sr.fee_paid, sr.fee_due_date, sr.additional,
+            p.risk_label.label("predicted_label"), w.scored_at,
+        )
+        .outerjoin(w, and_(w.student_id == sr.student_id, w.last_record_id == sr.id))
+        .outerjoin(p, p.id == w.prediction_id)
+        .order_by(sr.id)
+    )
+
+async def get_watermarks(db: AsyncSession) -> List[tuple]:
+    q = select(
+        models.ScoringWatermark.student_id, models.ScoringWatermark.last_record_id,
+        models.ScoringWatermark.scoring_version, models.ScoringWatermark.scored_at,
+    )
+    res = await db.execute(q)
+    return res.all()
+
+async def save_scoring_run(db: AsyncSession, rows: List[dict], record_ids: List[int], scoring_version: str) -> List[models.Prediction]:
+    """
+    Insert many predictions in one flush (batched INSERT ... RETURNING), move each
+    student's watermark to the scored record, and commit once.
+    """
+    preds = [models.Prediction(**row) for row in rows]
+    db.add_all(preds)
+    await db.flush()
+    now = datetime.datetime.utcnow()
+    marks = [
+        {"student_id": p.student_id, "last_record_id": int(rid), "scoring_version": scoring_version, "prediction_id": p.id, "scored_at": now}
+        for p, rid in zip(preds, record_ids)
+    ]
+    upsert = dialect_insert(db)
+    if marks and upsert is not None:
+        stmt = upsert(models.ScoringWatermark)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[models.ScoringWatermark.student_id],
+            set_={c: stmt.excluded[c] for c in ("last_record_id", "scoring_version", "prediction_id", "scored_at")},
+        )
+        await db.execute(stmt, marks)
+    elif marks:
+        await db.execute(delete(models.ScoringWatermark).where(models.ScoringWatermark.student_id.in_([m["student_id"] for m in marks])))
+        await db.execute(insert(models.ScoringWatermark), marks)
+    await db.commit()
+    return preds
+
+def current_predictions_query(after_id: Optional[int] = None) -> Select:
+    """The prediction each student's watermark points at, keyset-ordered by students.id."""
+    q = (
+        select(models.Prediction)
+        .join(models.ScoringWatermark, models.ScoringWatermark.prediction_id == models.Prediction.id)
+        .order_by(models.ScoringWatermark.student_id)
+    )
+    if after_id is not None:
+        q = q.where(models.ScoringWatermark.student_id > after_id)
+    return q
+
+async def get_current_prediction(db: AsyncSession, student_pk: int) -> Optional[models.Prediction]:
+    """The student's current prediction: two primary-key lookups, however long the history."""
+    q = current_predictions_query().where(models.ScoringWatermark.student_id == student_pk)
+    res = await db.execute(q)
+    return res.scalars().first()
+
+async def current_predictions(db: AsyncSession, limit: Optional[int] = None, after_id: Optional[int] = None) -> List[models.Prediction]:
+    q = current_predictions_query(after_id)
+    if limit is not None:
+        q = q.limit(limit)
+    res = await db.execute(q)
+    return res.scalars().all()
+
+async def stream_current_predictions(db: AsyncSession, after_id: Optional[int] = None, batch_size: int = 1000):
+    q = current_predictions_query(after_id).execution_options(yield_per=batch_size)
+    return await db.stream_scalars(q)
+
+def expired_predictions_query(cutoff: datetime.datetime, limit: int) -> Select:
+    """
+    The oldest predictions created before cutoff that are nobody's current
+    prediction, in id order (ids grow with created_at, so this walks the primary key).
+    """
+    p = models.Prediction
+    current = select(models.ScoringWatermark.prediction_id)
+    return (
+        select(p.id, p.student_id, p.risk_score, p.risk_label, p.created_at)
+        .where(p.created_at < cutoff, p.id.not_in(current))
+        .order_by(p.id)
+        .limit(limit)
+    )
+
+def risk_summary_query(components: List[str]) -> Select:
+    """
+    Per risk_label over each student's current prediction: count, score sum, and
+    sum/count of every rule component found in details (JSON, NULL when absent).
+    Components are only taken from rule-scored predictions: model predictions
+    (details with "proba") hold signed contributions under the same keys.
+    """
+    p = models.Prediction
+    rule_scored = p.details["proba"].as_string().is_(None)
+    cols = [p.risk_label, func.count().label("n"), func.sum(p.risk_score).label("score_sum")]
+    for c in components:
+        value = case((rule_scored, p.details[c].as_float()))
+        cols += [func.sum(value).label(f"{c}_sum"), func.count(value).label(f"{c}_n")]
+    return (
+        select(*cols)
+        .join(models.ScoringWatermark, models.ScoringWatermark.prediction_id == p.id)
+        .group_by(p.risk_label)
+    )
+
+def top_risk_query(limit: int) -> Select:
+    """The limit students with the highest current risk score."""
+    p = models.Prediction
+    return (
+        select(
+            p.student_id.label("student_pk"), models.Student.student_id, models.Student.name,
+            p.risk_score, p.risk_label, p.created_at,
+        )
+        .join(models.ScoringWatermark, models.ScoringWatermark.prediction_id == p.id)
+        .join(models.Student, models.Student.id == p.student_id)
+        .order_by(p.risk_score.desc(), p.student_id)
+        .limit(limit)
+    )
+
+def export_students_query() -> Select:
+    s = models.Student
+    return select(s.id, s.student_id, s.name, s.meta, s.created_at).order_by(s.id)
+
+def export_predictions_query() -> Select:
+    """Current prediction per student with the external student_id, for bulk export."""
+    p = models.Prediction
+    return (
+        select(
+            p.id, p.student_id.label("student_pk"), models.Student.student_id, p.risk_score,
+            p.risk_label, p.details, p.created_at,
+        )
+        .join(models.ScoringWatermark, models.ScoringWatermark.prediction_id == p.id)
+        .join(models.Student, models.Student.id == p.student_id)
+        .order_by(p.student_id)
+    )
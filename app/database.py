@@ -1,14 +1,47 @@
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from typing import AsyncGenerator
-from config import settings
+from .config import settings
+from .metrics import instrument_engine
 
-engine = create_async_engine(settings.DATABASE_URL, future=True, echo=False)
+def _engine_options(url: str) -> dict:
+    options = {"future": True, "echo": False, "pool_pre_ping": settings.DB_POOL_PRE_PING}
+    u = make_url(url)
+    if u.get_backend_name() == "sqlite" and u.database in (None, "", ":memory:"):
+        return options  # one shared in-memory connection (StaticPool), nothing to size
+    options.update(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+    )
+    if u.get_driver_name() == "asyncpg":
+        # SQLAlchemy's per-connection LRU of asyncpg prepared statements
+        options["connect_args"] = {"prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE}
+    return options
+
+engine = create_async_engine(settings.DATABASE_URL, **_engine_options(settings.DATABASE_URL))
+instrument_engine(engine)
+
+# reads that tolerate replica lag (listings, the predict feature scan, exports)
+if settings.READ_DATABASE_URL:
+    read_engine = create_async_engine(settings.READ_DATABASE_URL, **_engine_options(settings.READ_DATABASE_URL))
+    instrument_engine(read_engine, "replica")
+else:
+    read_engine = engine
 
 AsyncSessionLocal = sessionmaker(
     bind=engine, class_=AsyncSession, expire_on_commit=False
 )
+AsyncReadSessionLocal = sessionmaker(
+    bind=read_engine, class_=AsyncSession, expire_on_commit=False
+)
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     async with AsyncSessionLocal() as session:
         yield session
+
+async def get_read_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncReadSessionLocal() as session:
+        yield session
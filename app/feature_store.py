@@ -0,0 +1,146 @@
+"""
+Materialized per-student features (the student_features table).
+
+The ingest path folds every batch of new StudentRecord rows into one compact row
+per student: latest and previous test score, latest and running-mean attendance,
+attempts totals and the current fee state. Prediction then reads one row per
+student instead of scanning record history.
+
+fold_records defines "latest" for scoring: newest date first (undated records
+count as oldest), then newest id. Records older than what is already folded in
+(backfills) only update the totals.
+"""
+
+import asyncio
+import datetime
+from collections import defaultdict
+from typing import Dict, List, Optional
+from sqlalchemy import select, delete, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models
+from .crud import dialect_insert
+
+FEATURE_COLUMNS = [
+    "last_record_id", "latest_date", "attendance", "attendance_sum", "attendance_count",
+    "attendance_avg", "test_score", "prev_test_score", "attempts", "attempts_total",
+    "fee_paid", "fee_due_date", "record_count",
+]
+
+
+def _record_key(date: Optional[datetime.date], record_id: Optional[int]) -> tuple:
+    return (date is not None, date or datetime.date.min, record_id or 0)
+
+
+def fold_records(state: Optional[dict], records: List[dict]) -> dict:
+    """
+    Fold StudentRecord rows (dicts with id, student_id and the record columns) of one
+    student into its feature row. state is the current row, or None for a new student.
+    """
+    f = dict(state) if state else {
+        "student_id": records[0]["student_id"], "last_record_id": None, "latest_date": None,
+        "attendance": None, "attendance_sum": 0.0, "attendance_count": 0, "attendance_avg": None,
+        "test_score": None, "prev_test_score": None, "attempts": 0, "attempts_total": 0,
+        "fee_paid": True, "fee_due_date": None, "record_count": 0,
+    }
+    latest = _record_key(f["latest_date"], f["last_record_id"])
+    for r in sorted(records, key=lambda r: _record_key(r["date"], r["id"])):
+        f["record_count"] += 1
+        f["attempts_total"] += r["attempts"] or 0
+        if r["attendance"] is not None:
+            f["attendance_sum"] += r["attendance"]
+            f["attendance_count"] += 1
+        key = _record_key(r["date"], r["id"])
+        if key < latest:
+            continue
+        latest = key
+        f["last_record_id"], f["latest_date"] = r["id"], r["date"]
+        f["attempts"] = r["attempts"] or 0
+        if r["attendance"] is not None:
+            f["attendance"] = r["attendance"]
+        if r["test_score"] is not None:
+            f["prev_test_score"], f["test_score"] = f["test_score"], r["test_score"]
+        # fee state is always the latest record's: a record that
+        # marks the fee paid without a due date clears the overdue state
+        f["fee_paid"] = r["fee_paid"] if r["fee_paid"] is not None else True
+        f["fee_due_date"] = r["fee_due_date"]
+    f["attendance_avg"] = f["attendance_sum"] / f["attendance_count"] if f["attendance_count"] else None
+    return f
+
+
+async def _upsert_features(db: AsyncSession, rows: List[dict]) -> None:
+    now = datetime.datetime.utcnow()
+    for row in rows:
+        row["updated_at"] = now
+    upsert = dialect_insert(db)
+    if upsert is not None:
+        stmt = upsert(models.StudentFeature)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[models.StudentFeature.student_id],
+            set_={c: stmt.excluded[c] for c in FEATURE_COLUMNS + ["updated_at"]},
+        )
+        await db.execute(stmt, rows)
+    else:
+        await db.execute(delete(models.StudentFeature).where(models.StudentFeature.student_id.in_([r["student_id"] for r in rows])))
+        await db.execute(insert(models.StudentFeature), rows)
+
+
+async def apply_records(db: AsyncSession, records: List[dict]) -> None:
+    """Fold freshly inserted records into student_features. Does not commit."""
+    if not records:
+        return
+    by_student: Dict[int, List[dict]] = defaultdict(list)
+    for r in records:
+        by_student[r["student_id"]].append(r)
+    cols = [getattr(models.StudentFeature, c) for c in ["student_id"] + FEATURE_COLUMNS]
+    # read-modify-write: lock the rows (in key order, so concurrent uploads cannot deadlock)
+    # until the caller commits; students without a row yet are already serialized by the
+    # students upsert earlier in the same transaction
+    res = await db.execute(
+        select(*cols)
+        .where(models.StudentFeature.student_id.in_(sorted(by_student)))
+        .order_by(models.StudentFeature.student_id)
+        .with_for_update()
+    )
+    existing = {row["student_id"]: dict(row) for row in res.mappings()}
+    rows = [fold_records(existing.get(pk), recs) for pk, recs in by_student.items()]
+    await _upsert_features(db, rows)
+
+
+async def rebuild_features(db: AsyncSession, batch_size: int = 5000) -> int:
+    """Recompute student_features from the full record history (one-off backfill)."""
+    sr = models.StudentRecord
+    await db.execute(delete(models.StudentFeature))
+    q = select(
+        sr.id, sr.student_id, sr.date, sr.attendance, sr.test_score,
+        sr.attempts, sr.fee_paid, sr.fee_due_date,
+    ).order_by(sr.student_id).execution_options(yield_per=batch_size)
+    result = await db.stream(q)
+    pending: List[dict] = []
+    group: List[dict] = []
+    students = 0
+    async for row in result.mappings():
+        if group and row["student_id"] != group[0]["student_id"]:
+            pending.append(fold_records(None, group))
+            group = []
+        group.append(dict(row))
+        if len(pending) >= batch_size:
+            await _upsert_features(db, pending)
+            students += len(pending)
+            pending = []
+    if group:
+        pending.append(fold_records(None, group))
+    if pending:
+        await _upsert_features(db, pending)
+        students += len(pending)
+    await db.commit()
+    return students
+
+
+if __name__ == "__main__":
+    from .database import AsyncSessionLocal
+
+    async def main():
+        async with AsyncSessionLocal() as db:
+            print(f"rebuilt features for {await rebuild_features(db)} students")
+
+    asyncio.run(main())
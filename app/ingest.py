@@ -0,0 +1,181 @@
+"""
+Bulk ingest engine for uploaded student data.
+
+Rows are validated exactly like the original per-row path (StudentCreate /
+StudentRecordIn per row), but the database work is done set-wise:
+- students are upserted with INSERT ... ON CONFLICT (student_id) as one executemany
+- records are written with executemany in chunks of settings.INGEST_CHUNK_SIZE
+The caller owns the transaction, so a file is committed (or rolled back) as a whole.
+"""
+
+from __future__ import annotations
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+from sqlalchemy import select, insert, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, feature_store
+from .crud import dialect_insert
+from .config import settings
+from .schemas import StudentCreate, StudentRecordIn
+
+if TYPE_CHECKING:
+    import pandas as pd  # imported where used: keeps pandas off the worker startup path
+
+RECORD_COLUMNS = {"student_id", "name", "date", "attendance", "test_score", "fee_paid", "fee_due_date", "attempts"}
+MERGE_ROW = "__merge_row"  # occurrence of a row within its file, see merge_frames
+
+
+@dataclass
+class IngestStats:
+    rows: int = 0
+    students: int = 0
+    skipped: int = 0  # rows unchanged since the last ingest of the source
+    started: float = field(default_factory=time.perf_counter)
+    # stage -> [rows, seconds], for the parse/validate/write metrics
+    stages: Dict[str, List[float]] = field(default_factory=dict)
+
+    def add_stage(self, stage: str, rows: int, seconds: float) -> None:
+        entry = self.stages.setdefault(stage, [0, 0.0])
+        entry[0] += rows
+        entry[1] += seconds
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def rows_per_sec(self) -> float:
+        elapsed = self.elapsed
+        return self.rows / elapsed if elapsed > 0 else 0.0
+
+
+def merge_frames(frames: List[pd.DataFrame], names: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Consolidate partial frames (attendance, tests, fees, ...) into one row per
+    student, date and occurrence: for each column the first non-null value wins,
+    so three partial rows for the same student-day become one record. The n-th
+    row of a student (and date) in one file pairs with the n-th row in the others,
+    so files without a date column, or several rows per student-day, keep every
+    row as the single-file path does.
+    Raises ValueError naming the file when a date does not parse.
+    """
+    import pandas as pd
+    for i, df in enumerate(frames):
+        df["student_id"] = df["student_id"].astype(str)
+        keys = ["student_id"]
+        if "date" in df.columns:
+            parsed = pd.to_datetime(df["date"], errors="coerce", format="mixed")
+            bad = df["date"].notna() & parsed.isna()
+            if bad.any():
+                pos = int(bad.to_numpy().argmax())
+                name = names[i] if names else f"file {i + 1}"
+                raise ValueError(f"{name}: invalid date {df['date'].iloc[pos]!r} in row {pos + 1}")
+            df["date"] = parsed.dt.date
+            keys.append("date")
+        df[MERGE_ROW] = df.groupby(keys, sort=False, dropna=False).cumcount()
+    combined = pd.concat(frames, ignore_index=True, sort=False)
+    keys = ["student_id", "date", MERGE_ROW] if "date" in combined.columns else ["student_id", MERGE_ROW]
+    merged = combined.groupby(keys, sort=False, dropna=False, as_index=False).first().drop(columns=MERGE_ROW)
+    if "date" in merged.columns:
+        merged["date"] = merged["date"].astype(object).where(merged["date"].notna(), None)
+    return merged
+
+
+def validate_frame(df: pd.DataFrame) -> Tuple[Dict[str, Optional[str]], List[StudentRecordIn]]:
+    """
+    Validate every row the same way the per-row upload did.
+    Returns ({student_id: name}, [StudentRecordIn, ...]); later non-empty names win,
+    matching the old create_or_update_student behaviour.
+    """
+    import pandas as pd
+    columns = set(df.columns)
+    extra = [k for k in df.columns if k not in RECORD_COLUMNS]
+    names: Dict[str, Optional[str]] = {}
+    records: List[StudentRecordIn] = []
+    for row in df.to_dict("records"):
+        student = StudentCreate(student_id=str(row.get("student_id")), name=row.get("name"))
+        names[student.student_id] = student.name or names.get(student.student_id)
+        records.append(StudentRecordIn(
+            student_id=student.student_id,
+            date=row.get("date") if "date" in columns else None,
+            attendance=float(row.get("attendance")) if "attendance" in columns and pd.notna(row.get("attendance")) else None,
+            test_score=float(row.get("test_score")) if "test_score" in columns and pd.notna(row.get("test_score")) else None,
+            fee_paid=bool(row.get("fee_paid")) if "fee_paid" in columns else True,
+            fee_due_date=row.get("fee_due_date") if "fee_due_date" in columns else None,
+            attempts=int(row.get("attempts")) if "attempts" in columns and pd.notna(row.get("attempts")) else 0,
+            additional={k: row[k] for k in extra},
+        ))
+    return names, records
+
+
+async def upsert_students(db: AsyncSession, names: Dict[str, Optional[str]], chunk_size: int) -> Dict[str, int]:
+    """Upsert students as a set and return a student_id -> students.id map."""
+    upsert = dialect_insert(db)
+    items = list(names.items())
+    ids: Dict[str, int] = {}
+    for start in range(0, len(items), chunk_size):
+        chunk = items[start:start + chunk_size]
+        keys = [sid for sid, _ in chunk]
+        if upsert is not None:
+            stmt = upsert(models.Student)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[models.Student.student_id],
+                set_={"name": func.coalesce(stmt.excluded.name, models.Student.name)},
+            )
+            await db.execute(stmt, [{"student_id": sid, "name": name} for sid, name in chunk])
+        else:
+            # generic fallback: one SELECT for the chunk, then insert the missing ones
+            res = await db.execute(select(models.Student.student_id).where(models.Student.student_id.in_(keys)))
+            existing = set(res.scalars().all())
+            missing = [{"student_id": sid, "name": name} for sid, name in chunk if sid not in existing]
+            if missing:
+                await db.execute(insert(models.Student), missing)
+            for sid, name in chunk:
+                if sid in existing and name:
+                    await db.execute(models.Student.__table__.update().where(models.Student.student_id == sid).values(name=name))
+        res = await db.execute(select(models.Student.student_id, models.Student.id).where(models.Student.student_id.in_(keys)))
+        ids.update(res.tuples().all())
+    return ids
+
+
+async def insert_records(db: AsyncSession, records: List[StudentRecordIn], id_map: Dict[str, int], chunk_size: int) -> List[dict]:
+    """
+    Insert StudentRecord rows with executemany, chunk_size rows per round trip.
+    Returns the written rows with their new ids.
+    """
+    stmt = insert(models.StudentRecord).returning(models.StudentRecord.id, sort_by_parameter_order=True)
+    written = []
+    for start in range(0, len(records), chunk_size):
+        chunk = records[start:start + chunk_size]
+        rows = [{
+            "student_id": id_map[r.student_id],
+            "date": r.date,
+            "attendance": r.attendance,
+            "test_score": r.test_score,
+            "fee_paid": r.fee_paid,
+            "fee_due_date": r.fee_due_date,
+            "attempts": r.attempts,
+            "additional": r.additional,
+        } for r in chunk]
+        res = await db.execute(stmt, rows)
+        for row, record_id in zip(rows, res.scalars().all()):
+            row["id"] = record_id
+        written.extend(rows)
+    return written
+
+
+async def ingest_validated(
+    db: AsyncSession,
+    names: Dict[str, Optional[str]],
+    records: List[StudentRecordIn],
+    stats: IngestStats,
+    chunk_size: Optional[int] = None,
+) -> None:
+    """Write one validated batch and fold it into student_features. Does not commit."""
+    chunk_size = chunk_size or settings.INGEST_CHUNK_SIZE
+    id_map = await upsert_students(db, names, chunk_size)
+    written = await insert_records(db, records, id_map, chunk_size)
+    await feature_store.apply_records(db, written)
+    stats.rows += len(written)
+    stats.students += len(id_map)
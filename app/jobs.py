@@ -0,0 +1,90 @@
+"""
+In-process registry of asynchronous prediction jobs.
+
+POST /students/predict/jobs starts a job and returns its id at once; the job
+runs scoring.run_predictions in the background with its own DB session, and
+its status/progress can be polled while it runs. A job only keeps counts and
+the scoring version; the predictions it wrote are paged from
+/students/predictions. Job state is per worker process and only the most
+recent settings.JOBS_MAX_KEPT jobs are kept.
+"""
+
+import asyncio
+import datetime
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional
+from .config import settings
+from .database import AsyncSessionLocal, AsyncReadSessionLocal
+
+
+@dataclass
+class Job:
+    id: str
+    status: str = "pending"  # pending / running / done / failed
+    total: int = 0
+    done: int = 0
+    created_at: datetime.datetime = field(default_factory=datetime.datetime.utcnow)
+    finished_at: Optional[datetime.datetime] = None
+    error: Optional[str] = None
+    scoring_version: Optional[str] = None  # model + thresholds the run scored with
+
+    @property
+    def progress(self) -> float:
+        if self.status == "done":
+            return 1.0
+        return self.done / self.total if self.total else 0.0
+
+
+_jobs: "OrderedDict[str, Job]" = OrderedDict()
+_tasks: Dict[str, asyncio.Task] = {}
+
+
+def get_job(job_id: str) -> Optional[Job]:
+    return _jobs.get(job_id)
+
+
+def _remember(job: Job) -> None:
+    _jobs[job.id] = job
+    while len(_jobs) > settings.JOBS_MAX_KEPT:
+        oldest_id, oldest = next(iter(_jobs.items()))
+        if oldest.status in ("pending", "running"):
+            break
+        _jobs.pop(oldest_id)
+
+
+async def _run(job: Job, full: bool, release: Optional[Callable[[], None]]) -> None:
+    job.status = "running"
+
+    def on_total(n: int) -> None:
+        job.total = n
+
+    def on_progress(n: int) -> None:
+        job.done += n
+
+    try:
+        from .scoring import run_predictions, scoring_version  # heavy imports, deferred to the first job
+        job.scoring_version = scoring_version()
+        async with AsyncSessionLocal() as db, AsyncReadSessionLocal() as read_db:
+            await run_predictions(
+                db, full=full, on_total=on_total, on_progress=on_progress, load_results=False, read_db=read_db,
+            )
+        job.status = "done"
+    except Exception as e:
+        job.status = "failed"
+        job.error = str(e)
+    finally:
+        job.finished_at = datetime.datetime.utcnow()
+        _tasks.pop(job.id, None)
+        if release is not None:
+            release()
+
+
+def start_prediction_job(full: bool = False, release: Optional[Callable[[], None]] = None) -> Job:
+    """Start a job in the background; release (e.g. an admission slot) is called when it ends."""
+    job = Job(id=uuid.uuid4().hex)
+    _remember(job)
+    # keep a reference so the task is not garbage-collected mid-run
+    _tasks[job.id] = asyncio.create_task(_run(job, full, release))
+    return job
@@ -0,0 +1,119 @@
+"""
+Ingest ledger: makes re-uploading the same source file idempotent.
+
+Every upload is fingerprinted by the sha256 of its bytes (one hash per file,
+combined order-independently for multi-file uploads) and recorded in the
+ingest_ledger table together with a 64-bit digest of every parsed row.
+
+- A file whose bytes were ingested before is skipped after the hash and one
+  unique-index lookup, before any parsing or validation.
+- Otherwise its rows are digested as they are parsed and compared with the
+  digests of the last ingest of the same source (the ?source= given by the
+  caller, or the file names); only rows that are new or changed are validated
+  and written.
+
+Multi-file uploads are digested after merge_frames, row by merged row, which
+never matches the rows of any single file; they are tracked under their own
+identity (MERGED_SUFFIX), so a source fed sometimes as one file and sometimes
+as several sheets keeps two separate diff baselines.
+"""
+
+from __future__ import annotations
+import hashlib
+from typing import List, Optional, TYPE_CHECKING
+from fastapi import UploadFile
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd  # imported where used: keeps pandas off the worker startup path
+
+READ_BLOCK = 1 << 20
+MERGED_SUFFIX = " (merged)"
+
+
+def source_identity(files: List[UploadFile], source: Optional[str] = None) -> str:
+    if not source:
+        return ",".join(sorted((f.filename or "").strip().lower() for f in files))
+    return source.strip() + (MERGED_SUFFIX if len(files) > 1 else "")
+
+
+def _file_sha256(fileobj) -> str:
+    h = hashlib.sha256()
+    fileobj.seek(0)
+    for block in iter(lambda: fileobj.read(READ_BLOCK), b""):
+        h.update(block)
+    fileobj.seek(0)
+    return h.hexdigest()
+
+
+def content_hash(files: List[UploadFile]) -> str:
+    """sha256 of the upload's bytes; several files hash the same in any order. Blocking."""
+    digests = sorted(_file_sha256(f.file) for f in files)
+    if len(digests) == 1:
+        return digests[0]
+    return hashlib.sha256("".join(digests).encode()).hexdigest()
+
+
+def row_digests(df: pd.DataFrame) -> np.ndarray:
+    """
+    One uint64 per row over its values, independent of column order. Numbers are
+    compared as float64 so 5 and 5.0 (an int chunk and a chunk with gaps) agree.
+    """
+    import numpy as np
+    import pandas as pd
+    columns = sorted(df.columns)
+    frame = df[columns]
+    numeric = [c for c in columns if pd.api.types.is_numeric_dtype(frame[c]) and not pd.api.types.is_bool_dtype(frame[c])]
+    if numeric:
+        frame = frame.astype({c: "float64" for c in numeric})
+    names = int.from_bytes(hashlib.blake2b("\0".join(columns).encode(), digest_size=8).digest(), "little")
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy(dtype=np.uint64) ^ np.uint64(names)
+
+
+def changed_rows(digests: np.ndarray, previous: np.ndarray) -> np.ndarray:
+    """Boolean mask of the rows whose digest is not in the previous ingest."""
+    import numpy as np
+    if not len(previous):
+        return np.ones(len(digests), dtype=bool)
+    return ~np.isin(digests, previous)
+
+
+def split_changed(df: pd.DataFrame, previous: np.ndarray):
+    """(rows of df that are new or changed, digests of all rows of df). Blocking."""
+    digests = row_digests(df)
+    mask = changed_rows(digests, previous)
+    return (df if mask.all() else df[mask]), digests
+
+
+async def find_ingest(db: AsyncSession, content_hash: str) -> Optional[models.IngestLedger]:
+    res = await db.execute(select(models.IngestLedger).where(models.IngestLedger.content_hash == content_hash))
+    return res.scalars().first()
+
+
+async def previous_digests(db: AsyncSession, source: str) -> np.ndarray:
+    """Row digests of the last ingest of source (empty when there was none)."""
+    import numpy as np
+    res = await db.execute(
+        select(models.IngestLedger.row_digests)
+        .where(models.IngestLedger.source == source)
+        .order_by(models.IngestLedger.id.desc())
+        .limit(1)
+    )
+    blob = res.scalar()
+    return np.frombuffer(blob, dtype=np.uint64) if blob else np.empty(0, dtype=np.uint64)
+
+
+async def record_ingest(db: AsyncSession, source: str, content_hash: str, digests: List[np.ndarray], written_rows: int) -> models.IngestLedger:
+    """Add the ledger row for an upload; committed with its records by the caller."""
+    import numpy as np
+    packed = np.concatenate(digests).astype(np.uint64) if digests else np.empty(0, dtype=np.uint64)
+    entry = models.IngestLedger(
+        source=source, content_hash=content_hash, row_count=len(packed),
+        written_rows=written_rows, row_digests=packed.tobytes(),
+    )
+    db.add(entry)
+    await db.flush()
+    return entry
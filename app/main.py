@@ -1,8 +1,15 @@
+import asyncio
+import sys
+import time
 import uvicorn
-from fastapi import FastAPI
-from .routers import auth_router, upload_router, students_router
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
+from .routers import auth_router, upload_router, students_router, export_router
 from .database import engine
-from . import models
+from . import metrics
+from .config import settings
+from .migrate import migrate
+from .profiling import RequestProfiler
 from fastapi.middleware.cors import CORSMiddleware
 
 app = FastAPI(title="Student Risk Assessment API", version="0.1.0")
@@ -15,16 +22,62 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    stats = metrics.RequestStats()
+    metrics.request_stats.set(stats)
+    profiler = RequestProfiler() if settings.PROFILING_ENABLED and request.headers.get("x-profile") == "1" else None
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+    finally:
+        # label by route template, not raw path, to keep cardinality bounded
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        metrics.REQUEST_LATENCY.observe(time.perf_counter() - start, request.method, route, status_code)
+        metrics.DB_QUERIES_PER_REQUEST.observe(stats.queries, route)
+        metrics.DB_TIME_PER_REQUEST.observe(stats.db_seconds, route)
+        if profiler is not None:
+            profile_path = profiler.stop(route)
+    if profiler is not None:
+        response.headers["X-Profile-Path"] = profile_path
+    return response
+
 # include routers
 app.include_router(auth_router.router)
 app.include_router(upload_router.router)
 app.include_router(students_router.router)
+app.include_router(export_router.router)
+
+def _import_ml_stack() -> None:
+    from . import ingest, utils, scoring
+    scoring.model_registry.get()
+
+async def _warm_up() -> None:
+    # pandas/NumPy/sklearn and the model are not needed to answer / or /auth/token;
+    # load them in a thread once the worker is serving, after its first requests
+    await asyncio.sleep(settings.WARMUP_DELAY_SECONDS)
+    await asyncio.to_thread(_import_ml_stack)
 
 @app.on_event("startup")
 async def startup():
-    # make sure tables exist (simple approach)
-    async with engine.begin() as conn:
-        await conn.run_sync(models.Base.metadata.create_all)
+    # schema creation is a deploy step (python -m app.migrate), opt-in here
+    if settings.AUTO_CREATE_SCHEMA:
+        await migrate(engine)
+    if settings.WARMUP_ON_STARTUP:
+        app.state.warmup = asyncio.create_task(_warm_up())
+
+@app.on_event("shutdown")
+async def shutdown():
+    # only if something imported scoring; importing it here would load the ML stack
+    scoring = sys.modules.get(f"{__package__}.scoring")
+    if scoring is not None:
+        scoring.shutdown_executor()
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/")
 async def root():
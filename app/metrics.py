@@ -0,0 +1,202 @@
+"""
+Low-overhead in-process metrics exported in Prometheus text format at /metrics.
+
+Counters, gauges and histograms are plain Python objects guarded by a lock;
+observing a value is a dict lookup plus a bisect. Metrics are per worker process.
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: Tuple) -> Tuple[str, ...]:
+        if len(labels) != len(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}")
+        return tuple(str(v) for v in labels)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, doc, labels=()):
+        super().__init__(name, doc, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, *labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_fmt_labels(self.label_names, k)} {v}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, *labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def dec(self, amount: float = 1.0, *labels) -> None:
+        self.inc(-amount, *labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, doc, labels=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, doc, labels)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [bucket counts..., +Inf count], sum
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels) -> None:
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][idx] += 1
+            entry[1][0] += value
+
+    def time(self, *labels) -> "_Timer":
+        return _Timer(self, labels)
+
+    def _samples(self):
+        out = []
+        with self._lock:
+            items = [(k, list(c), s[0]) for k, (c, s) in self._values.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                out.append(f"{self.name}_bucket{_fmt_labels(self.label_names, key, le)} {cumulative}")
+            out.append(f"{self.name}_sum{_fmt_labels(self.label_names, key)} {total}")
+            out.append(f"{self.name}_count{_fmt_labels(self.label_names, key)} {cumulative}")
+        return out
+
+
+class _Timer:
+    def __init__(self, hist: Histogram, labels: Tuple):
+        self.hist = hist
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+        self.hist.observe(self.elapsed, *self.labels)
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- application metrics -------------------------------------------------------
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status"))
+DB_QUERY_LATENCY = Histogram("db_query_duration_seconds", "Time per SQL statement", ("engine",))
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request", "SQL statements executed per HTTP request", ("route",),
+    buckets=(0, 1, 2, 5, 10, 25, 50, 100, 250, 1000),
+)
+DB_TIME_PER_REQUEST = Histogram("db_time_per_request_seconds", "Total SQL time per HTTP request", ("route",))
+UPLOAD_STAGE_ROWS = Counter("upload_stage_rows_total", "Rows handled by each upload stage", ("stage",))
+UPLOAD_STAGE_SECONDS = Counter("upload_stage_seconds_total", "Time spent in each upload stage", ("stage",))
+UPLOAD_DUPLICATES = Counter("upload_duplicates_total", "Uploads skipped because the same bytes were ingested before")
+UPLOAD_STAGE_RATE = Gauge("upload_stage_rows_per_second", "Rows/sec of each upload stage in the last upload", ("stage",))
+PREDICT_STAGE_LATENCY = Histogram("predict_stage_duration_seconds", "predict_risk time by stage", ("stage",))
+BCRYPT_LATENCY = Histogram("bcrypt_duration_seconds", "bcrypt hash/verify time", ("op",), buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.0, 5.0))
+ADMISSION_IN_FLIGHT = Gauge("admission_in_flight", "Requests holding an admission slot", ("route_class",))
+ADMISSION_QUEUE_DEPTH = Gauge("admission_queue_depth", "Requests waiting for an admission slot", ("route_class",))
+ADMISSION_REJECTED = Counter("admission_rejected_total", "Requests shed by admission control", ("route_class", "reason"))
+ADMISSION_WAIT = Histogram("admission_wait_seconds", "Time queued for an admission slot", ("route_class",))
+EXECUTOR_QUEUE_DEPTH = Gauge("executor_queue_depth", "Tasks submitted to an executor and not yet started", ("executor",))
+
+
+def observe_upload_stage(stage: str, rows: int, seconds: float) -> None:
+    UPLOAD_STAGE_ROWS.inc(rows, stage)
+    UPLOAD_STAGE_SECONDS.inc(seconds, stage)
+
+
+def observe_predict_timings(timings: Dict[str, float]) -> None:
+    for stage, seconds in timings.items():
+        PREDICT_STAGE_LATENCY.observe(seconds, stage)
+
+
+# --- per-request SQL accounting -------------------------------------------------
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+request_stats: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("request_stats", default=None)
+
+
+def instrument_engine(async_engine, name: str = "primary") -> None:
+    """Time every SQL statement on the engine and charge it to the current request."""
+    from sqlalchemy import event
+
+    sync_engine = async_engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        DB_QUERY_LATENCY.observe(elapsed, name)
+        stats = request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
@@ -0,0 +1,64 @@
+"""
+Schema bootstrap, run once per deploy instead of in every worker's startup.
+
+    python -m app.migrate
+
+Creates the tables that do not exist yet (create_all is idempotent, existing
+tables are left alone) and the indexes declared on existing tables since they
+were created. On a large PostgreSQL predictions table, create new indexes by
+hand with CREATE INDEX CONCURRENTLY first to avoid blocking writes. Workers only do this themselves when
+settings.AUTO_CREATE_SCHEMA is set, which is convenient for local SQLite runs.
+
+When student_features is created on a database that already holds records, it
+is backfilled from them (feature_store.rebuild_features): scoring reads only
+that table, so until then /students/predict would score nobody.
+"""
+
+import asyncio
+from typing import List
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from . import feature_store, models
+
+
+async def migrate(engine: AsyncEngine) -> List[str]:
+    """Bring the schema up to date; returns the names of the tables and indexes created."""
+    async with engine.begin() as conn:
+        before = set(await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_table_names()))
+        await conn.run_sync(models.Base.metadata.create_all)
+        indexes = await conn.run_sync(_create_missing_indexes, before)
+    created = [t for t in models.Base.metadata.tables if t not in before] + indexes
+    features = models.StudentFeature.__tablename__
+    if features not in before and models.StudentRecord.__tablename__ in before:
+        async with AsyncSession(engine) as db:
+            students = await feature_store.rebuild_features(db)
+        created.append(f"{features} backfill ({students} students)")
+    return created
+
+
+def _create_missing_indexes(sync_conn, tables) -> List[str]:
+    insp = inspect(sync_conn)
+    created = []
+    for name in tables:
+        table = models.Base.metadata.tables.get(name)
+        if table is None:
+            continue
+        existing = {ix["name"] for ix in insp.get_indexes(name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(sync_conn)
+                created.append(index.name)
+    return created
+
+
+if __name__ == "__main__":
+    from .database import engine
+
+    async def main():
+        try:
+            created = await migrate(engine)
+        finally:
+            await engine.dispose()
+        print(f"created: {', '.join(created)}" if created else "schema up to date")
+
+    asyncio.run(main())
@@ -6,7 +6,7 @@ Simple ML pipeline:
 - Save/load model to disk (joblib)
 """
 
-from typing import Tuple, Dict, Any
+from typing import Tuple, Dict, Any, Optional
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestClassifier
@@ -14,34 +14,66 @@ from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler
 import joblib
 import os
-from config import settings
+import hashlib
+import time
+from .config import settings
+from .compiled_forest import CompiledForest
+from .model_registry import ModelRegistry
 
 MODEL_PATH = settings.MODEL_PATH
+RISK_LABELS = np.array(["low", "medium", "high"], dtype=object)
 
-def feature_engineer(df: pd.DataFrame) -> pd.DataFrame:
-    df2 = df.copy()
-    # Ensure expected columns
-    # fill missing numeric with reasonable defaults
-    df2["attendance"] = pd.to_numeric(df2.get("attendance", np.nan), errors="coerce").fillna(0)
-    df2["test_score"] = pd.to_numeric(df2.get("test_score", np.nan), errors="coerce").fillna(0)
-    df2["attempts"] = pd.to_numeric(df2.get("attempts", 0), errors="coerce").fillna(0)
-    df2["fee_paid"] = df2.get("fee_paid", True).astype(bool)
-    # Score trend: if previous_score exists, compute drop
-    if "prev_test_score" in df2.columns:
-        df2["score_drop"] = df2["prev_test_score"] - df2["test_score"]
-    else:
-        df2["score_drop"] = 0.0
-    # Fee delinquent numeric
-    if "days_past_due" in df2.columns:
-        df2["days_past_due"] = pd.to_numeric(df2["days_past_due"], errors="coerce").fillna(0)
-    else:
-        df2["days_past_due"] = 0
-    # Build final features
-    features = df2[["attendance", "test_score", "score_drop", "attempts", "days_past_due"]].copy()
-    # Clip scales
-    features["attendance"] = features["attendance"].clip(0,100)
-    features["test_score"] = features["test_score"].clip(0,100)
-    return features
+FEATURE_COLUMNS = ["attendance", "test_score", "score_drop", "attempts", "days_past_due"]
+# risk score weight of each class code (0 low, 1 medium, 2 high), see score_model
+CLASS_RISK_WEIGHTS = np.array([0.0, 0.5, 1.0])
+# model explanations: signed per-feature contributions, reported under the rule component
+# of the same signal; the forest's average score and features without a rule counterpart
+# go to OTHER_COMPONENT, so the components sum to risk_score
+FEATURE_COMPONENTS = {
+    "attendance": "attendance_component",
+    "score_drop": "drop_component",
+    "attempts": "attempts_component",
+    "days_past_due": "fee_component",
+}
+OTHER_COMPONENT = "other_component"
+
+# loaded pipeline is cached per process and hot-reloaded when MODEL_PATH changes
+model_registry = ModelRegistry(MODEL_PATH, settings.MODEL_VERSIONS_DIR, settings.COMPILED_FOREST_MAX_ROWS or None)
+
+def _fill_column(df: pd.DataFrame, name: str, out: np.ndarray, default: float = 0.0) -> None:
+    """Write df[name] (coerced to numbers, gaps -> default) into the column view out."""
+    if name not in df.columns:
+        out[:] = default
+        return
+    values = df[name]
+    if not pd.api.types.is_numeric_dtype(values):
+        values = pd.to_numeric(values, errors="coerce")
+    # no copy for float columns; the cast happens while writing into out
+    out[:] = values.to_numpy(dtype=np.float64, na_value=np.nan)
+    out[np.isnan(out)] = default
+
+def feature_engineer(df: pd.DataFrame, dtype=np.float32) -> pd.DataFrame:
+    """
+    FEATURE_COLUMNS as one matrix of dtype, filled column by column straight from
+    df: df is not copied or modified, and the returned frame wraps the matrix
+    without copying it (to_numpy() is the same array predict_proba gets).
+    Missing values and columns count as 0. Models get float32, what their trees
+    compare in anyway; rule-based scoring needs float64, since its thresholds
+    (e.g. a drop of exactly TEST_DROP_THRESHOLD) must see the stored values.
+    """
+    X = np.empty((len(df), len(FEATURE_COLUMNS)), dtype=dtype)
+    attendance, test_score, score_drop, attempts, days_past_due = (X[:, i] for i in range(len(FEATURE_COLUMNS)))
+    _fill_column(df, "attendance", attendance)
+    _fill_column(df, "test_score", test_score)
+    _fill_column(df, "attempts", attempts)
+    _fill_column(df, "days_past_due", days_past_due)
+    # score trend: drop from the previous test score (before clipping), 0 without one
+    _fill_column(df, "prev_test_score", score_drop, default=np.nan)
+    score_drop -= test_score
+    score_drop[np.isnan(score_drop)] = 0.0
+    np.clip(attendance, 0, 100, out=attendance)
+    np.clip(test_score, 0, 100, out=test_score)
+    return pd.DataFrame(X, index=df.index, columns=FEATURE_COLUMNS, copy=False)
 
 def rule_based_score(row: pd.Series) -> Tuple[float, str, Dict[str, Any]]:
     """
@@ -79,49 +111,198 @@ def rule_based_score(row: pd.Series) -> Tuple[float, str, Dict[str, Any]]:
     details.update({"attendance_component": att_risk, "drop_component": drop_risk, "attempts_component": attempts_risk, "fee_component": fee_risk})
     return float(score), label, details
 
-def train_model(X: pd.DataFrame, y: pd.Series) -> Pipeline:
+def build_pipeline(**params) -> Pipeline:
+    """Scaler + RandomForest; params override the forest defaults."""
+    params = {"n_estimators": 100, "random_state": 42, **params}
+    return Pipeline([("scaler", StandardScaler()), ("rf", RandomForestClassifier(**params))])
+
+def train_model(X: pd.DataFrame, y: pd.Series, promote: bool = True) -> Pipeline:
     """
-    Train a RandomForest classifier.
+    Train a RandomForest classifier on all cores.
     y should be labels: 0 (low), 1 (medium), 2 (high)
+    The model is published as a new version (see app.training for the full
+    pipeline) and, with promote=True, becomes the served model.
     """
-    clf = RandomForestClassifier(n_estimators=100, random_state=42)
-    pipe = Pipeline([("scaler", StandardScaler()), ("rf", clf)])
-    pipe.fit(X, y)
-    # persist
-    os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
-    joblib.dump(pipe, MODEL_PATH)
+    pipe = build_pipeline(n_jobs=-1)
+    t0 = time.perf_counter()
+    # fitted on the bare matrix, as score_model passes it: no feature-name checks or warnings
+    pipe.fit(X.to_numpy(), y)
+    missing = missing_classes(pipe.classes_)
+    if promote and missing:
+        raise ValueError(f"not serving a model that cannot predict {', '.join(missing)}")
+    version = model_registry.publish(pipe, {
+        "features": list(X.columns),
+        "params": pipe.named_steps["rf"].get_params(),
+        "n_samples": len(X),
+        "train_seconds": time.perf_counter() - t0,
+    })
+    if promote:
+        model_registry.promote(version)
     return pipe
 
 def load_model() -> Pipeline | None:
-    if os.path.exists(MODEL_PATH):
-        return joblib.load(MODEL_PATH)
-    return None
+    return model_registry.get()
+
+def scoring_version() -> str:
+    """
+    Fingerprint of everything that changes scores besides the data: the model file
+    (or rule-based mode) and the thresholds in config.Settings. Cheap enough for
+    the event loop: the model file is stat'ed, not loaded.
+    """
+    parts = (
+        model_registry.current_label() or "rules",
+        settings.ATTENDANCE_THRESHOLD,
+        settings.TEST_DROP_THRESHOLD,
+        settings.FEE_DELINQUENT_DAYS,
+    )
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:16]
+
+# (model, its CompiledForest or None): built once per loaded model
+_explainer: Tuple[Any, Optional[CompiledForest]] = (None, None)
+
+def explainer_for(model) -> Optional[CompiledForest]:
+    """The flat-array forest behind model, for explanations; None if model is not a forest."""
+    global _explainer
+    if isinstance(model, CompiledForest):
+        return model
+    cached, forest = _explainer
+    if cached is not model:
+        try:
+            forest = CompiledForest.from_pipeline(model, max_rows=settings.COMPILED_FOREST_MAX_ROWS)
+        except TypeError:
+            forest = None
+        _explainer = (model, forest)
+    return forest
+
+def model_classes(model) -> np.ndarray:
+    """Class codes (indexes into RISK_LABELS) of the predict_proba columns."""
+    return np.asarray(model.classes_, dtype=int)
+
+def missing_classes(codes) -> list:
+    """Risk labels not among class codes (e.g. model.classes_); only models missing none are served."""
+    present = set(np.asarray(codes, dtype=int).tolist())
+    return [str(label) for code, label in enumerate(RISK_LABELS) if code not in present]
 
-def predict_risk(df: pd.DataFrame) -> pd.DataFrame:
+def score_model(model: Pipeline, features: pd.DataFrame) -> pd.DataFrame:
+    """
+    Run predict_proba over the whole feature matrix in batches of
+    settings.INFERENCE_BATCH_SIZE rows and map probabilities to score/label.
+    Columns are matched to classes through model.classes_, so a model fitted on a
+    subset of the classes still scores correctly (absent classes get 0).
+    For forest models the same pass yields per-feature contributions to the
+    score, as component columns (see FEATURE_COMPONENTS).
+    """
+    X = features.to_numpy()
+    batch = settings.INFERENCE_BATCH_SIZE
+    classes = model_classes(model)
+    weights = CLASS_RISK_WEIGHTS[classes]
+    forest = explainer_for(model)
+    contrib = None
+    if forest is not None:
+        parts = [forest.explain(X[i:i + batch], weights) for i in range(0, len(X), batch)]
+        proba = np.vstack([p[0] for p in parts])
+        contrib = np.vstack([p[1] for p in parts])
+        bias = parts[0][2]
+    else:
+        proba = np.vstack([model.predict_proba(X[i:i + batch]) for i in range(0, len(X), batch)])
+    # score is the expected class weight (low 0, medium 0.5, high 1); the label the likeliest class
+    risk_score = proba @ weights
+    out = pd.DataFrame({
+        "risk_score": risk_score,
+        "risk_label": RISK_LABELS[classes[np.argmax(proba, axis=1)]],
+    }, index=features.index)
+    if contrib is not None:
+        other = np.full(len(X), bias)
+        for j, name in enumerate(features.columns[:contrib.shape[1]]):
+            if name in FEATURE_COMPONENTS:
+                out[FEATURE_COMPONENTS[name]] = contrib[:, j]
+            else:
+                other += contrib[:, j]
+        out[OTHER_COMPONENT] = other
+    for code in range(len(RISK_LABELS)):
+        hit = np.flatnonzero(classes == code)
+        out[f"proba_{code}"] = proba[:, hit[0]] if len(hit) else 0.0
+    return out
+
+def _py_max(a, b):
+    # elementwise Python max(a, b): b only when strictly greater (keeps NaN semantics)
+    return np.where(b > a, b, a)
+
+def _py_min(a, b):
+    # elementwise Python min(a, b): b only when strictly smaller
+    return np.where(b < a, b, a)
+
+def score_rules(features: pd.DataFrame) -> pd.DataFrame:
+    """
+    Columnar version of rule_based_score: every component and the label thresholds
+    are whole-array NumPy operations, with the same operation order so results are
+    identical to calling rule_based_score row by row.
+    Returns a DataFrame with risk_score, risk_label and one column per component.
+    """
+    attendance = features["attendance"].to_numpy(dtype=np.float64)
+    score_drop = features["score_drop"].to_numpy(dtype=np.float64)
+    attempts = features["attempts"].to_numpy(dtype=np.float64)
+    days_past_due = features["days_past_due"].to_numpy(dtype=np.float64)
+    att_thr = settings.ATTENDANCE_THRESHOLD
+    with np.errstate(invalid="ignore"):
+        att_risk = np.where(attendance < att_thr, _py_max(0.0, (att_thr - attendance) / att_thr) * 0.6, 0.0)
+        drop_risk = np.where(score_drop > settings.TEST_DROP_THRESHOLD, _py_min(0.3, (score_drop / 100.0) * 0.3 * 10), 0.0)
+        attempts_risk = _py_min(0.2, (attempts / 5.0) * 0.2)
+        fee_risk = np.where(days_past_due > settings.FEE_DELINQUENT_DAYS, 0.2, 0.0)
+        score = _py_max(0.0, _py_min(1.0, att_risk + drop_risk + attempts_risk + fee_risk))
+        label = np.select([score >= 0.7, score >= 0.35], ["high", "medium"], "low")
+    return pd.DataFrame({
+        "risk_score": score,
+        "risk_label": label.astype(object),
+        "attendance_component": att_risk,
+        "drop_component": drop_risk,
+        "attempts_component": attempts_risk,
+        "fee_component": fee_risk,
+    }, index=features.index)
+
+RULE_COMPONENTS = ["attendance_component", "drop_component", "attempts_component", "fee_component"]
+
+def prediction_details(preds: pd.DataFrame) -> list:
+    """
+    Build the per-row details dicts (what Prediction.details stores) from the
+    columnar output of predict_risk. Only called at serialization time.
+    """
+    components = [c for c in RULE_COMPONENTS + [OTHER_COMPONENT] if c in preds.columns]
+    proba_cols = sorted((c for c in preds.columns if c.startswith("proba_")), key=lambda c: int(c.split("_")[1]))
+    comp_values = preds[components].to_numpy(dtype=float).tolist() if components else None
+    proba_values = preds[proba_cols].to_numpy(dtype=float).tolist() if proba_cols else None
+    details = []
+    for i in range(len(preds)):
+        d = dict(zip(components, comp_values[i])) if comp_values is not None else {}
+        if proba_values is not None:
+            d["proba"] = proba_values[i]
+        details.append(d)
+    return details
+
+def predict_risk(df: pd.DataFrame, timings: Optional[Dict[str, float]] = None) -> pd.DataFrame:
     """
     Accept merged df, run engineering, then predict:
     - If model exists, use model to get label probabilities and map to risk score
     - Otherwise fallback to rule-based scoring
-    Return a DataFrame with student_id, risk_score, risk_label, details
+    Return a DataFrame with student_id, risk_score, risk_label and the detail columns
+    (components, plus proba_<class> for the model); use prediction_details()
+    to serialize them.
+    If timings is given, seconds spent per stage are added to it.
     """
-    features = feature_engineer(df)
+    t0 = time.perf_counter()
     model = load_model()
-    results = []
-    for idx, row in features.iterrows():
-        if model:
-            # model predicts classes 0,1,2
-            prob = model.predict_proba([row.values])[0]
-            # map to score: weighted by probabilities (0->low, 2->high)
-            risk_score = float((prob[1] * 0.5) + (prob[2] * 1.0))  # simple mapping
-            label_idx = int(np.argmax(prob))
-            label = {0: "low", 1: "medium", 2: "high"}.get(label_idx, "low")
-            details = {"proba": prob.tolist()}
-        else:
-            risk_score, label, details = rule_based_score(row)
-        results.append({
-            "student_id": df.iloc[idx].get("student_id"),
-            "risk_score": risk_score,
-            "risk_label": label,
-            "details": details
-        })
-    return pd.DataFrame(results)
+    if not len(df):
+        model = None
+    t1 = time.perf_counter()
+    features = feature_engineer(df, np.float32 if model is not None else np.float64)
+    t2 = time.perf_counter()
+    if model is not None:
+        out = score_model(model, features)
+    else:
+        out = score_rules(features)
+    if timings is not None:
+        timings["model_load"] = timings.get("model_load", 0.0) + (t1 - t0)
+        timings["feature_engineering"] = timings.get("feature_engineering", 0.0) + (t2 - t1)
+        timings["inference"] = timings.get("inference", 0.0) + (time.perf_counter() - t2)
+    out.insert(0, "student_id", df["student_id"].to_numpy() if "student_id" in df.columns else None)
+    return out.reset_index(drop=True)
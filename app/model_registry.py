@@ -0,0 +1,191 @@
+"""
+In-process cache for the trained risk model, and the on-disk versions behind it.
+
+The pipeline is loaded once per process and kept in memory. Every get() does a
+cheap os.stat of the model file; when its mtime/size/inode change the new file is
+loaded by a single caller while everyone else keeps using the current model, and
+the new one is swapped in with one reference assignment.
+
+Trained models are published as immutable version directories
+(<versions_dir>/<version>/model.joblib + metadata.json). The serving path is a
+symlink to one of them, replaced atomically by promote(), so a reader never sees
+a half-written file. Forest pipelines are also compiled to flat arrays
+(compiled_forest) at publish time; when those are present get() maps them instead
+of unpickling the estimator.
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+import joblib
+from .compiled_forest import CompiledForest
+
+MODEL_FILE = "model.joblib"
+METADATA_FILE = "metadata.json"
+COMPILED_DIR = "compiled"
+
+
+class ModelRegistry:
+    def __init__(self, path: str, versions_dir: Optional[str] = None, compiled_max_rows: Optional[int] = None):
+        self.path = path
+        self.versions_dir = versions_dir or os.path.join(os.path.dirname(path), "versions")
+        # None: always serve the joblib pipeline; otherwise batches up to this size use compiled arrays
+        self.compiled_max_rows = compiled_max_rows
+        self._lock = threading.Lock()
+        # (file signature, loaded model, version label); replaced as a whole so readers never see a mix
+        self._entry: Optional[Tuple[tuple, Any, str]] = None
+
+    def _signature(self) -> Optional[tuple]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def get(self) -> Any:
+        """Return the current model, or None when no model file exists."""
+        sig = self._signature()
+        entry = self._entry
+        if sig is None:
+            self._entry = None
+            return None
+        if entry is not None and entry[0] == sig:
+            return entry[1]
+        # the very first load has to wait; later reloads are done by whoever gets the
+        # lock first while concurrent callers keep serving the previous model
+        if not self._lock.acquire(blocking=entry is None):
+            return entry[1]
+        try:
+            entry = self._entry
+            if entry is None or entry[0] != sig:
+                # resolve the symlink once so the label always matches the file loaded
+                real = os.path.realpath(self.path)
+                entry = (sig, self._load(real), self._label(real, sig))
+                self._entry = entry
+            return entry[1]
+        finally:
+            self._lock.release()
+
+    def _load(self, real: str) -> Any:
+        compiled = os.path.join(os.path.dirname(real), COMPILED_DIR)
+        if self.compiled_max_rows is not None and os.path.isdir(compiled):
+            return CompiledForest.load(compiled, pipeline_path=real, max_rows=self.compiled_max_rows)
+        return joblib.load(real)
+
+    def _published_version(self, real: str) -> Optional[str]:
+        folder = os.path.dirname(real)
+        if os.path.dirname(folder) == os.path.realpath(self.versions_dir):
+            return os.path.basename(folder)
+        return None
+
+    def _label(self, real: str, sig: tuple) -> str:
+        version = self._published_version(real)
+        if version is not None:
+            return version
+        # a plain file at MODEL_PATH (copied or trained before versioning)
+        mtime_ns, size, _ = sig
+        return f"{mtime_ns:x}-{size:x}"
+
+    @property
+    def version(self) -> Optional[str]:
+        """Identifier of the loaded model, None when running rule-based."""
+        entry = self._entry
+        return entry[2] if entry is not None else None
+
+    def current_label(self) -> Optional[str]:
+        """
+        Version label of the model file at path right now, without loading it (one
+        os.stat, plus resolving the symlink when it changed); None when there is none.
+        """
+        sig = self._signature()
+        if sig is None:
+            return None
+        entry = self._entry
+        if entry is not None and entry[0] == sig:
+            return entry[2]
+        return self._label(os.path.realpath(self.path), sig)
+
+    def clear(self) -> None:
+        self._entry = None
+
+    def publish(self, model: Any, metadata: Dict[str, Any]) -> str:
+        """
+        Write model and metadata as a new immutable version and return its name.
+        The directory is assembled under a temporary name and renamed into place.
+        """
+        version = time.strftime("%Y%m%dT%H%M%S", time.gmtime()) + "-" + uuid.uuid4().hex[:8]
+        os.makedirs(self.versions_dir, exist_ok=True)
+        tmp = os.path.join(self.versions_dir, f".{version}.tmp")
+        os.makedirs(tmp)
+        try:
+            joblib.dump(model, os.path.join(tmp, MODEL_FILE))
+            _try_compile(model, os.path.join(tmp, COMPILED_DIR))
+            with open(os.path.join(tmp, METADATA_FILE), "w") as f:
+                json.dump(dict(metadata, version=version), f, indent=2, default=str)
+            os.rename(tmp, os.path.join(self.versions_dir, version))
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        return version
+
+    def compile(self, version: str) -> bool:
+        """Add compiled arrays to a version published without them; False if not compilable."""
+        folder = os.path.join(self.versions_dir, version)
+        if os.path.isdir(os.path.join(folder, COMPILED_DIR)):
+            return True
+        tmp = os.path.join(folder, f".{COMPILED_DIR}.{os.getpid()}.tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        if not _try_compile(self.load(version), tmp):
+            return False
+        os.rename(tmp, os.path.join(folder, COMPILED_DIR))
+        return True
+
+    def promote(self, version: str) -> None:
+        """Point the serving path at a published version with one atomic rename."""
+        target = os.path.join(self.versions_dir, version, MODEL_FILE)
+        if not os.path.isfile(target):
+            raise FileNotFoundError(f"unknown model version: {version}")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+        try:
+            os.symlink(os.path.relpath(target, os.path.dirname(self.path) or "."), tmp)
+        except (OSError, NotImplementedError):
+            # no symlink support (e.g. unprivileged Windows): fall back to an atomic copy
+            shutil.copyfile(target, tmp)
+        os.replace(tmp, self.path)
+
+    def current(self) -> Optional[str]:
+        """The published version the serving path points at, if any."""
+        if not os.path.exists(self.path):
+            return None
+        return self._published_version(os.path.realpath(self.path))
+
+    def load(self, version: str) -> Any:
+        """The pipeline of a published version (joblib, not the compiled arrays)."""
+        return joblib.load(os.path.join(self.versions_dir, version, MODEL_FILE))
+
+    def metadata(self, version: str) -> Dict[str, Any]:
+        with open(os.path.join(self.versions_dir, version, METADATA_FILE)) as f:
+            return json.load(f)
+
+    def versions(self) -> List[Dict[str, Any]]:
+        """Metadata of every published version, oldest first."""
+        if not os.path.isdir(self.versions_dir):
+            return []
+        names = sorted(n for n in os.listdir(self.versions_dir) if not n.startswith("."))
+        return [self.metadata(n) for n in names if os.path.isfile(os.path.join(self.versions_dir, n, METADATA_FILE))]
+
+
+def _try_compile(model: Any, path: str) -> bool:
+    try:
+        forest = CompiledForest.from_pipeline(model)
+    except TypeError:
+        return False  # not a scaler + forest pipeline: served through joblib only
+    forest.save(path)
+    return True
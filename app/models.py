@@ -1,5 +1,6 @@
 from sqlalchemy import (
-    Column, Integer, String, Float, DateTime, Boolean, ForeignKey, JSON, Date
+    Column, Integer, String, Float, DateTime, Boolean, ForeignKey, JSON, Date, Index, UniqueConstraint,
+    LargeBinary,
 )
 from sqlalchemy.orm import relationship, declarative_base
 import datetime
@@ -37,6 +38,36 @@ class StudentRecord(Base):
     additional = Column(JSON, nullable=True)  # any other data
     student = relationship("Student", back_populates="records")
 
+class IngestLedger(Base):
+    """One row per ingested upload: its content hash and a digest of every row (see ledger)."""
+    __tablename__ = "ingest_ledger"
+    id = Column(Integer, primary_key=True, index=True)
+    source = Column(String(512), index=True, nullable=False)  # identity: ?source= or the file names
+    content_hash = Column(String(64), unique=True, nullable=False)  # sha256 of the file bytes
+    row_count = Column(Integer, nullable=False)
+    written_rows = Column(Integer, nullable=False)  # rows new or changed since the last ingest of source
+    row_digests = Column(LargeBinary, nullable=True)  # packed uint64 per row, for the next diff
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class StudentFeature(Base):
+    """Rolling per-student aggregates maintained by the ingest path (see feature_store)."""
+    __tablename__ = "student_features"
+    student_id = Column(Integer, ForeignKey("students.id"), primary_key=True)
+    last_record_id = Column(Integer, nullable=True)  # newest StudentRecord folded in
+    latest_date = Column(Date, nullable=True)
+    attendance = Column(Float, nullable=True)  # latest known, percent
+    attendance_sum = Column(Float, default=0.0)
+    attendance_count = Column(Integer, default=0)
+    attendance_avg = Column(Float, nullable=True)  # running mean over all records
+    test_score = Column(Float, nullable=True)  # latest known
+    prev_test_score = Column(Float, nullable=True)  # the one before it
+    attempts = Column(Integer, default=0)  # latest record
+    attempts_total = Column(Integer, default=0)
+    fee_paid = Column(Boolean, default=True)
+    fee_due_date = Column(Date, nullable=True)
+    record_count = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
 class Prediction(Base):
     __tablename__ = "predictions"
     id = Column(Integer, primary_key=True, index=True)
@@ -45,3 +76,37 @@ class Prediction(Base):
     risk_label = Column(String(32), nullable=False)  # e.g., 'low', 'medium', 'high'
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     details = Column(JSON, nullable=True)
+    __table_args__ = (
+        # per-student history in time order
+        Index("ix_predictions_student_created", "student_id", "created_at"),
+    )
+
+class PredictionRollup(Base):
+    """Prediction history older than the retention window, one row per student and day/week (see retention)."""
+    __tablename__ = "prediction_rollups"
+    id = Column(Integer, primary_key=True, index=True)
+    student_id = Column(Integer, ForeignKey("students.id"), nullable=False)
+    period = Column(String(8), nullable=False)  # 'day' or 'week'
+    period_start = Column(Date, nullable=False)
+    count = Column(Integer, nullable=False)
+    score_sum = Column(Float, nullable=False)
+    score_min = Column(Float, nullable=False)
+    score_max = Column(Float, nullable=False)
+    label_counts = Column(JSON, nullable=True)  # {"low": n, ...}
+    last_score = Column(Float, nullable=False)
+    last_label = Column(String(32), nullable=False)
+    last_created_at = Column(DateTime, nullable=False)
+    __table_args__ = (UniqueConstraint("student_id", "period", "period_start", name="uq_prediction_rollups_bucket"),)
+
+class ScoringWatermark(Base):
+    """
+    What was last scored for a student: lets /students/predict skip unchanged students.
+    prediction_id is the student's current prediction, kept up to date by every
+    scoring run, so current-risk lookups are primary-key reads.
+    """
+    __tablename__ = "scoring_watermarks"
+    student_id = Column(Integer, ForeignKey("students.id"), primary_key=True)
+    last_record_id = Column(Integer, nullable=False)  # StudentRecord.id that was scored
+    scoring_version = Column(String(64), nullable=False)  # model file + thresholds
+    prediction_id = Column(Integer, ForeignKey("predictions.id"), nullable=False)
+    scored_at = Column(DateTime, default=datetime.datetime.utcnow)
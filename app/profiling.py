@@ -0,0 +1,43 @@
+"""
+Optional per-request profiler.
+
+With settings.PROFILING_ENABLED, a request carrying "X-Profile: 1" is profiled
+and the report is written under settings.PROFILE_DIR; the response names the file
+in X-Profile-Path. pyinstrument (a sampling profiler with asyncio support) is
+used when installed, cProfile otherwise.
+"""
+
+import os
+import re
+import time
+from .config import settings
+
+
+class RequestProfiler:
+    def __init__(self):
+        try:
+            from pyinstrument import Profiler
+            self._profiler = Profiler(async_mode="enabled")
+            self._profiler.start()
+            self.kind = "pyinstrument"
+        except ImportError:
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+            self.kind = "cprofile"
+
+    def stop(self, route: str) -> str:
+        """Stop profiling and write the report; returns its path."""
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        name = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+        base = os.path.join(settings.PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{name}")
+        if self.kind == "pyinstrument":
+            self._profiler.stop()
+            path = base + ".html"
+            with open(path, "w") as f:
+                f.write(self._profiler.output_html())
+        else:
+            self._profiler.disable()
+            path = base + ".prof"
+            self._profiler.dump_stats(path)
+        return path
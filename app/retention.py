@@ -0,0 +1,150 @@
+"""
+Retention for the predictions table.
+
+Every scoring run appends one Prediction per rescored student, so history grows
+without bound. compact() rolls predictions older than
+settings.PREDICTION_RETENTION_DAYS into PredictionRollup rows (one per student
+and day or week: count, score sum/min/max, label counts and the last score) and
+deletes them. A student's current prediction (the one its ScoringWatermark
+points at) is never touched, however old.
+
+Work is done in batches of settings.RETENTION_BATCH_SIZE predictions, each its
+own short transaction, so scoring runs and reads are never blocked for long and
+an interrupted run simply resumes where it stopped. Run it from cron:
+
+    python -m app.retention [--days 90] [--period week] [--batch-size 5000]
+"""
+
+import argparse
+import asyncio
+import datetime
+from typing import Dict, List, Optional
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import crud, models
+from .config import settings
+
+PERIODS = ("day", "week")
+ROLLUP_FIELDS = ("count", "score_sum", "score_min", "score_max", "label_counts", "last_score", "last_label", "last_created_at")
+
+
+def period_start(created_at: datetime.datetime, period: str) -> datetime.date:
+    day = created_at.date()
+    return day - datetime.timedelta(days=day.weekday()) if period == "week" else day
+
+
+def _rollup(rows, period: str) -> Dict[tuple, dict]:
+    buckets: Dict[tuple, dict] = {}
+    for _, student_id, score, label, created_at in rows:
+        key = (student_id, period_start(created_at, period))
+        b = buckets.get(key)
+        if b is None:
+            buckets[key] = {
+                "count": 1, "score_sum": score, "score_min": score, "score_max": score,
+                "label_counts": {label: 1}, "last_score": score, "last_label": label, "last_created_at": created_at,
+            }
+            continue
+        b["count"] += 1
+        b["score_sum"] += score
+        b["score_min"] = min(b["score_min"], score)
+        b["score_max"] = max(b["score_max"], score)
+        b["label_counts"][label] = b["label_counts"].get(label, 0) + 1
+        if created_at >= b["last_created_at"]:
+            b["last_score"], b["last_label"], b["last_created_at"] = score, label, created_at
+    return buckets
+
+
+def _merge(b: dict, old: models.PredictionRollup) -> None:
+    """Fold an existing rollup row (from an earlier run) into bucket b."""
+    b["count"] += old.count
+    b["score_sum"] += old.score_sum
+    b["score_min"] = min(b["score_min"], old.score_min)
+    b["score_max"] = max(b["score_max"], old.score_max)
+    labels = dict(old.label_counts or {})
+    for label, n in b["label_counts"].items():
+        labels[label] = labels.get(label, 0) + n
+    b["label_counts"] = labels
+    if old.last_created_at > b["last_created_at"]:
+        b["last_score"], b["last_label"], b["last_created_at"] = old.last_score, old.last_label, old.last_created_at
+
+
+async def _save_rollups(db: AsyncSession, buckets: Dict[tuple, dict], period: str) -> None:
+    r = models.PredictionRollup
+    res = await db.execute(
+        select(r).where(
+            r.period == period,
+            r.student_id.in_({k[0] for k in buckets}),
+            r.period_start.in_({k[1] for k in buckets}),
+        )
+    )
+    for old in res.scalars():
+        b = buckets.get((old.student_id, old.period_start))
+        if b is not None:
+            _merge(b, old)
+    values = [{"student_id": s, "period": period, "period_start": d, **b} for (s, d), b in buckets.items()]
+    upsert = crud.dialect_insert(db)
+    if upsert is not None:
+        stmt = upsert(r)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[r.student_id, r.period, r.period_start],
+            set_={c: stmt.excluded[c] for c in ROLLUP_FIELDS},
+        )
+        await db.execute(stmt, values)
+        return
+    for v in values:
+        await db.execute(delete(r).where(r.student_id == v["student_id"], r.period == period, r.period_start == v["period_start"]))
+    await db.execute(insert(r), values)
+
+
+async def compact(db: AsyncSession, days: Optional[int] = None, period: Optional[str] = None,
+                  batch_size: Optional[int] = None, now: Optional[datetime.datetime] = None) -> Dict[str, int]:
+    """Roll up and delete expired predictions, one committed batch at a time."""
+    days = settings.PREDICTION_RETENTION_DAYS if days is None else days
+    period = period or settings.PREDICTION_ROLLUP_PERIOD
+    batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+    if period not in PERIODS:
+        raise ValueError(f"period must be one of {PERIODS}, got {period!r}")
+    stats = {"deleted": 0, "buckets": 0, "batches": 0}
+    if days <= 0:
+        return stats
+    cutoff = (now or datetime.datetime.utcnow()) - datetime.timedelta(days=days)
+    while True:
+        res = await db.execute(crud.expired_predictions_query(cutoff, batch_size))
+        rows: List[tuple] = res.all()
+        if not rows:
+            break
+        buckets = _rollup(rows, period)
+        await _save_rollups(db, buckets, period)
+        await db.execute(delete(models.Prediction).where(models.Prediction.id.in_([row[0] for row in rows])))
+        await db.commit()
+        stats["deleted"] += len(rows)
+        stats["buckets"] += len(buckets)
+        stats["batches"] += 1
+        if len(rows) < batch_size:
+            break
+    return stats
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Roll up and delete prediction history past the retention window.")
+    p.add_argument("--days", type=int, default=None, help="keep this many days of raw history (default: PREDICTION_RETENTION_DAYS)")
+    p.add_argument("--period", choices=PERIODS, default=None, help="rollup bucket (default: PREDICTION_ROLLUP_PERIOD)")
+    p.add_argument("--batch-size", type=int, default=None, help="predictions per transaction (default: RETENTION_BATCH_SIZE)")
+    args = p.parse_args(argv)
+
+    from .database import AsyncSessionLocal, engine
+
+    async def run():
+        try:
+            async with AsyncSessionLocal() as db:
+                return await compact(db, args.days, args.period, args.batch_size)
+        finally:
+            await engine.dispose()
+
+    stats = asyncio.run(run())
+    print(f"rolled up {stats['deleted']} predictions into {stats['buckets']} buckets in {stats['batches']} batches")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
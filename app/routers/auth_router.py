@@ -1,23 +1,23 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from .. import crud
+from .. import admission, crud
 from ..schemas import UserCreate, Token, UserLogin, UserRegisterResponse # Updated imports
 from ..database import get_db
-from ..auth import create_access_token, hash_password, verify_password
+from ..auth import create_access_token, hash_password_async, verify_password_async
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
-@router.post("/register", response_model=UserRegisterResponse) # Updated response_model
+@router.post("/register", response_model=UserRegisterResponse, dependencies=[Depends(admission.admit("auth"))]) # Updated response_model
 async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
     existing = await crud.get_user_by_username(db, user.username)
     if existing:
         raise HTTPException(status_code=400, detail="Username already exists")
     
-    hashed = hash_password(user.password)
+    hashed = await hash_password_async(user.password)
     created = await crud.create_user(db, user, hashed)
     return {"message": "user created", "username": created.username}
 
-@router.post("/token", response_model=Token)
+@router.post("/token", response_model=Token, dependencies=[Depends(admission.admit("auth"))])
 async def login_for_access_token(
     user_credentials: UserLogin, # Updated parameter
     db: AsyncSession = Depends(get_db)
@@ -26,7 +26,7 @@ async def login_for_access_token(
     Expect JSON body with {"username": "...", "password": "..."}
     """
     db_user = await crud.get_user_by_username(db, user_credentials.username)
-    if not db_user or not verify_password(
+    if not db_user or not await verify_password_async(
         user_credentials.password, db_user.hashed_password
     ):
         raise HTTPException(
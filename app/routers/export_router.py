@@ -0,0 +1,118 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import types as sqltypes
+from sqlalchemy.sql import Select
+import json
+from ..database import get_read_db
+from .. import admission, crud
+from ..auth import get_current_user, ensure_role
+from ..config import settings
+
+router = APIRouter(prefix="/export", tags=["export"])
+
+DATASETS = {
+    "students": crud.export_students_query,
+    "features": crud.feature_rows_query,
+    "predictions": crud.export_predictions_query,
+}
+MEDIA_TYPES = {"parquet": "application/vnd.apache.parquet", "arrow": "application/vnd.apache.arrow.stream"}
+
+class _ChunkSink:
+    """Write-only file object: collects what the Arrow writers emit so it can be streamed out."""
+    closed = False
+
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def _arrow_schema(pa, q: Select):
+    """Arrow schema from the SQLAlchemy column types, so every batch has the same dtypes."""
+    fields = []
+    for col in q.selected_columns:
+        t = col.type
+        if isinstance(t, sqltypes.Boolean):
+            at = pa.bool_()
+        elif isinstance(t, sqltypes.Integer):
+            at = pa.int64()
+        elif isinstance(t, sqltypes.Float):
+            at = pa.float64()
+        elif isinstance(t, sqltypes.DateTime):
+            at = pa.timestamp("us")
+        elif isinstance(t, sqltypes.Date):
+            at = pa.date32()
+        else:
+            # strings, and JSON columns serialized as JSON text
+            at = pa.string()
+        fields.append(pa.field(col.name, at))
+    return pa.schema(fields)
+
+def _encode_batch(pa, schema, json_cols, rows):
+    columns = list(zip(*rows))
+    arrays = []
+    for i, field in enumerate(schema):
+        values = columns[i]
+        if i in json_cols:
+            values = [json.dumps(v) if v is not None else None for v in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.record_batch(arrays, schema=schema)
+
+@router.get("/{dataset}", dependencies=[Depends(admission.admit("export"))])
+async def export_dataset(
+    dataset: str,
+    format: str = Query("parquet", pattern="^(parquet|arrow)$"),
+    db: AsyncSession = Depends(get_read_db),
+    token=Depends(get_current_user),
+):
+    """
+    Stream students, features (student_features) or predictions (current per student)
+    as Parquet or an Arrow IPC stream, read from a server-side cursor batch by batch.
+    """
+    ensure_role(token, ["mentor", "admin"])
+    if dataset not in DATASETS:
+        raise HTTPException(status_code=404, detail=f"Unknown dataset, expected one of {sorted(DATASETS)}")
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise HTTPException(status_code=501, detail="Export requires pyarrow to be installed")
+    q = DATASETS[dataset]()
+    schema = _arrow_schema(pa, q)
+    json_cols = {i for i, col in enumerate(q.selected_columns) if isinstance(col.type, sqltypes.JSON)}
+    result = await db.stream(q.execution_options(yield_per=settings.EXPORT_BATCH_SIZE))
+
+    async def body():
+        sink = _ChunkSink()
+        writer = pq.ParquetWriter(sink, schema) if format == "parquet" else pa.ipc.new_stream(sink, schema)
+        try:
+            async for part in result.partitions(settings.EXPORT_BATCH_SIZE):
+                batch = await run_in_threadpool(_encode_batch, pa, schema, json_cols, part)
+                writer.write_batch(batch)
+                yield sink.drain()
+        finally:
+            writer.close()
+        yield sink.drain()
+
+    filename = f"{dataset}.{'parquet' if format == 'parquet' else 'arrows'}"
+    return StreamingResponse(body(), media_type=MEDIA_TYPES[format], headers={"Content-Disposition": f'attachment; filename="{filename}"'})
@@ -1,62 +1,138 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from ..database import get_db
+from ..database import get_db, get_read_db
 from .. import crud
 from ..auth import get_current_user, ensure_role
-from ..schemas import PredictionOut, StudentOut
-from typing import List
-import pandas as pd
-from ..ml_pipeline import predict_risk, feature_engineer
+from ..schemas import PredictionOut, StudentOut, JobOut, RiskSummaryOut
+from typing import List, Optional
+from pydantic import BaseModel
 from sqlalchemy import select
-from .. import models
-import datetime
+from .. import admission, models, jobs, summary
+from ..config import settings
 
 router = APIRouter(prefix="/students", tags=["students"])
 
+CURSOR_QUERY = Query(None, ge=0, description="Keyset cursor: return rows after this students.id (see X-Next-Cursor)")
+FORMAT_QUERY = Query("json", pattern="^(json|ndjson)$", description="ndjson streams every row from a server-side cursor")
+
+def _ndjson_response(result, schema: type[BaseModel]) -> StreamingResponse:
+    """Serialize rows as they arrive from the cursor, one JSON document per line."""
+    async def lines():
+        async for part in result.partitions(settings.STREAM_BATCH_SIZE):
+            yield "".join(schema.model_validate(obj).model_dump_json() + "\n" for obj in part)
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+def _set_next_cursor(response: Response, items: list, limit: int, key) -> None:
+    if len(items) == limit:
+        response.headers["X-Next-Cursor"] = str(key(items[-1]))
+
 @router.get("/", response_model=List[StudentOut])
-async def list_students(limit: int = Query(100, ge=1, le=1000), db: AsyncSession = Depends(get_db), token=Depends(get_current_user)):
+async def list_students(
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    after: Optional[int] = CURSOR_QUERY,
+    format: str = FORMAT_QUERY,
+    db: AsyncSession = Depends(get_read_db),
+    token=Depends(get_current_user),
+):
     # Ensure only mentors/admins can list
     ensure_role(token, ["mentor", "admin"])
-    students = await crud.list_students(db, limit=limit)
+    if format == "ndjson":
+        return _ndjson_response(await crud.stream_students(db, after, settings.STREAM_BATCH_SIZE), StudentOut)
+    students = await crud.list_students(db, limit=limit, after_id=after)
+    _set_next_cursor(response, students, limit, lambda s: s.id)
     return students
 
-@router.get("/predict", response_model=List[PredictionOut])
-async def generate_predictions(db: AsyncSession = Depends(get_db), token=Depends(get_current_user)):
+@router.get("/predictions", response_model=List[PredictionOut])
+async def list_current_predictions(
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    after: Optional[int] = CURSOR_QUERY,
+    format: str = FORMAT_QUERY,
+    db: AsyncSession = Depends(get_read_db),
+    token=Depends(get_current_user),
+):
+    """Current prediction of each student without rescoring, paged by students.id."""
+    ensure_role(token, ["mentor", "admin"])
+    if format == "ndjson":
+        return _ndjson_response(await crud.stream_current_predictions(db, after, settings.STREAM_BATCH_SIZE), PredictionOut)
+    preds = await crud.current_predictions(db, limit=limit, after_id=after)
+    _set_next_cursor(response, preds, limit, lambda p: p.student_id)
+    return preds
+
+@router.get("/summary", response_model=RiskSummaryOut)
+async def risk_summary(
+    top: int = Query(10, ge=0, le=100, description="How many of the riskiest students to list"),
+    db: AsyncSession = Depends(get_read_db),
+    token=Depends(get_current_user),
+):
     """
-    Pull latest records, create a merged DataFrame keyed by student_id, and run prediction.
-    Saves predictions to DB and returns them.
+    Risk distribution of the current predictions: counts per label, average score and
+    rule components, and the top riskiest students. Read-only and served from cache;
+    new predictions invalidate it.
     """
     ensure_role(token, ["mentor", "admin"])
-    # Query latest student records - for simplicity, get latest record per student
-    q = select(models.Student, models.StudentRecord).join(models.StudentRecord, models.Student.id==models.StudentRecord.student_id)
-    res = await db.execute(q)
-    rows = res.all()
-    if not rows:
-        return []
-    # Build DataFrame
-    data = []
-    for student, record in rows:
-        data.append({
-            "student_id": student.student_id,
-            "name": student.name,
-            "attendance": record.attendance,
-            "test_score": record.test_score,
-            "attempts": record.attempts,
-            "fee_paid": record.fee_paid,
-            "fee_due_date": record.fee_due_date,
-            # compute days past due
-            "days_past_due": (datetime.date.today() - record.fee_due_date).days if record.fee_due_date else 0
-        })
-    df = pd.DataFrame(data)
-    if df.empty:
-        return []
-    preds_df = predict_risk(df)
-    results = []
-    for _, pred in preds_df.iterrows():
-        # find student internal id
-        s = await crud.get_student_by_student_id(db, pred["student_id"])
-        if not s:
-            continue
-        p = await crud.create_prediction(db, s.id, float(pred["risk_score"]), pred["risk_label"], pred["details"])
-        results.append(p)
-    return results
+    return await summary.get_summary(db, top)
+
+@router.get("/predict", response_model=List[PredictionOut], dependencies=[Depends(admission.admit("predict"))])
+async def generate_predictions(
+    full: bool = Query(False, description="Rescore every student instead of only changed ones"),
+    format: str = FORMAT_QUERY,
+    db: AsyncSession = Depends(get_db),
+    read_db: AsyncSession = Depends(get_read_db),
+    token=Depends(get_current_user),
+):
+    """
+    Pull the latest record per student and score the students whose data, model or
+    thresholds changed since their last prediction (everyone when full=true).
+    Scoring runs on the process pool; saves new predictions to DB and returns the
+    current prediction of every student (streamed as NDJSON with format=ndjson).
+    """
+    ensure_role(token, ["mentor", "admin"])
+    # pandas/sklearn load on first use (or in the startup warm-up), not at import time
+    from ..scoring import run_predictions
+    if format == "ndjson":
+        await run_predictions(db, full=full, load_results=False, read_db=read_db)
+        return _ndjson_response(await crud.stream_current_predictions(db, batch_size=settings.STREAM_BATCH_SIZE), PredictionOut)
+    return await run_predictions(db, full=full, read_db=read_db)
+
+@router.post("/predict/jobs", response_model=JobOut, status_code=202)
+async def create_prediction_job(
+    full: bool = Query(False, description="Rescore every student instead of only changed ones"),
+    token=Depends(get_current_user),
+):
+    """
+    Start a background prediction run and return its job id immediately. The job
+    holds a predict admission slot until it finishes; 429 when none is free.
+    """
+    ensure_role(token, ["mentor", "admin"])
+    return jobs.start_prediction_job(full=full, release=admission.hold("predict"))
+
+@router.get("/predict/jobs/{job_id}", response_model=JobOut)
+async def get_prediction_job(job_id: str, token=Depends(get_current_user)):
+    """
+    Poll a prediction job: status, progress (students scored of total) and scoring
+    version. Page the resulting predictions with GET /students/predictions.
+    """
+    ensure_role(token, ["mentor", "admin"])
+    job = jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/{student_id}/prediction", response_model=PredictionOut)
+async def get_current_prediction(
+    student_id: str,
+    db: AsyncSession = Depends(get_read_db),
+    token=Depends(get_current_user),
+):
+    """Current risk of one student (by external student_id) without rescoring."""
+    ensure_role(token, ["mentor", "admin"])
+    student = await crud.get_student_by_student_id(db, student_id)
+    if student is None:
+        raise HTTPException(status_code=404, detail="Student not found")
+    pred = await crud.get_current_prediction(db, student.id)
+    if pred is None:
+        raise HTTPException(status_code=404, detail="Student has not been scored yet")
+    return pred
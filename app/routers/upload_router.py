@@ -1,11 +1,14 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
+import asyncio
+import time
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
-import pandas as pd
-from ..utils import read_tabular_file, normalize_columns
-from ..schemas import UploadResponse, StudentRecordIn, StudentCreate
+from typing import List, Optional
+from ..utils import iter_tabular_file, read_tabular_file, normalize_columns
+from ..schemas import UploadResponse
 from ..database import get_db
-from .. import crud
+from ..config import settings
+from .. import admission, ingest, ledger, metrics
 from fastapi import status
 from fastapi.security import OAuth2PasswordBearer
 from ..auth import get_current_user
@@ -13,39 +16,119 @@ from fastapi.concurrency import run_in_threadpool
 
 router = APIRouter(prefix="/upload", tags=["upload"])
 
-@router.post("/files", response_model=UploadResponse)
+def _require_student_id(df, file: UploadFile) -> None:
+    if "student_id" not in df.columns:
+        raise HTTPException(status_code=422, detail=f"File {file.filename} must contain 'student_id' column")
+
+async def _drop_unchanged(df, previous, digests: list, stats: ingest.IngestStats):
+    """Digest the rows, keep the ones the last ingest of this source did not have."""
+    t0 = time.perf_counter()
+    df, row_digests = await run_in_threadpool(ledger.split_changed, df, previous)
+    digests.append(row_digests)
+    stats.skipped += len(row_digests) - len(df)
+    stats.add_stage("dedup", len(row_digests), time.perf_counter() - t0)
+    return df
+
+async def _ingest_stream(db: AsyncSession, file: UploadFile, stats: ingest.IngestStats, previous, digests: list) -> None:
+    """Single file: parse chunk by chunk and write each chunk as soon as it is parsed."""
+    chunks = iter_tabular_file(file, settings.INGEST_CHUNK_SIZE)
+    try:
+        while True:
+            # parsing (blocking) in threadpool, one chunk at a time
+            t0 = time.perf_counter()
+            df = await run_in_threadpool(next, chunks, None)
+            if df is None:
+                break
+            stats.add_stage("parse", len(df), time.perf_counter() - t0)
+            df = normalize_columns(df)
+            _require_student_id(df, file)
+            df = await _drop_unchanged(df, previous, digests, stats)
+            if len(df):
+                await _validate_and_write(db, df, stats)
+    finally:
+        chunks.close()
+
+async def _validate_and_write(db: AsyncSession, df, stats: ingest.IngestStats) -> None:
+    # per-row validation is CPU-bound, keep it off the event loop
+    t0 = time.perf_counter()
+    names, records = await run_in_threadpool(ingest.validate_frame, df)
+    t1 = time.perf_counter()
+    await ingest.ingest_validated(db, names, records, stats)
+    stats.add_stage("validate", len(records), t1 - t0)
+    stats.add_stage("write", len(records), time.perf_counter() - t1)
+
+async def _ingest_merged(db: AsyncSession, files: List[UploadFile], stats: ingest.IngestStats, previous, digests: list) -> None:
+    """Several files: parse them concurrently, merge by student and date (see merge_frames), write the merged set."""
+    t0 = time.perf_counter()
+    frames = await asyncio.gather(*(run_in_threadpool(read_tabular_file, f) for f in files))
+    stats.add_stage("parse", sum(len(df) for df in frames), time.perf_counter() - t0)
+    for df, file in zip(frames, files):
+        normalize_columns(df)
+        _require_student_id(df, file)
+    try:
+        merged = await run_in_threadpool(ingest.merge_frames, list(frames), [f.filename for f in files])
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    del frames
+    merged = await _drop_unchanged(merged, previous, digests, stats)
+    size = settings.INGEST_CHUNK_SIZE
+    for start in range(0, len(merged), size):
+        await _validate_and_write(db, merged.iloc[start:start + size], stats)
+
+def _duplicate_response(entry) -> dict:
+    return {
+        "message": "duplicate upload skipped", "processed_records": 0,
+        "skipped_records": entry.row_count, "duplicate": True, "ingest_id": entry.id,
+    }
+
+@router.post("/files", response_model=UploadResponse, dependencies=[Depends(admission.admit("upload"))])
 async def upload_files(
     files: List[UploadFile] = File(...),
+    source: Optional[str] = Query(None, max_length=500, description="Identity of the feed (e.g. registrar-attendance); default: the file names"),
     db: AsyncSession = Depends(get_db),
     token_data = Depends(get_current_user)
 ):
     """
     Accept multiple files (attendance/test/fees) and process them.
     This endpoint expects files to contain a 'student_id' column (case-insensitive).
-    It will parse each file and insert/update student records accordingly.
+    A single file is streamed in chunks; several files are parsed in parallel and
+    merged into one record per student and date before anything is written.
+    Rows are validated one by one and written in bulk inside a single transaction.
+    Uploads are idempotent (see ledger): bytes ingested before are skipped, and
+    rows unchanged since the last upload of the same source are not written again.
     """
-    processed = 0
-    for file in files:
-        # reading (blocking) in threadpool
-        df = await run_in_threadpool(read_tabular_file, file)
-        df = normalize_columns(df)
-        if "student_id" not in df.columns:
-            raise HTTPException(status_code=422, detail=f"File {file.filename} must contain 'student_id' column")
-        # iterate rows and push records
-        for _, row in df.iterrows():
-            # safe extraction with defaults
-            student_payload = StudentCreate(student_id=str(row.get("student_id")), name=row.get("name"))
-            await crud.create_or_update_student(db, student_payload)
-            rec = StudentRecordIn(
-                student_id=str(row.get("student_id")),
-                date=row.get("date") if "date" in df.columns else None,
-                attendance=float(row.get("attendance")) if "attendance" in df.columns and pd.notna(row.get("attendance")) else None,
-                test_score=float(row.get("test_score")) if "test_score" in df.columns and pd.notna(row.get("test_score")) else None,
-                fee_paid=bool(row.get("fee_paid")) if "fee_paid" in df.columns else True,
-                fee_due_date=row.get("fee_due_date") if "fee_due_date" in df.columns else None,
-                attempts=int(row.get("attempts")) if "attempts" in df.columns and pd.notna(row.get("attempts")) else 0,
-                additional={k: row[k] for k in df.columns if k not in {"student_id","name","date","attendance","test_score","fee_paid","fee_due_date","attempts"}}
-            )
-            await crud.add_student_record(db, rec)
-            processed += 1
-    return {"message": "files processed", "processed_records": processed}
+    fingerprint = await run_in_threadpool(ledger.content_hash, files)
+    seen = await ledger.find_ingest(db, fingerprint)
+    if seen is not None:
+        metrics.UPLOAD_DUPLICATES.inc()
+        return _duplicate_response(seen)
+    identity = ledger.source_identity(files, source)
+    previous = await ledger.previous_digests(db, identity)
+    stats = ingest.IngestStats()
+    digests: list = []
+    try:
+        if len(files) == 1:
+            await _ingest_stream(db, files[0], stats, previous, digests)
+        else:
+            await _ingest_merged(db, files, stats, previous, digests)
+        entry = await ledger.record_ingest(db, identity, fingerprint, digests, stats.rows)
+        await db.commit()
+    except IntegrityError:
+        # the same bytes were ingested concurrently and committed first
+        await db.rollback()
+        seen = await ledger.find_ingest(db, fingerprint)
+        if seen is None:
+            raise
+        metrics.UPLOAD_DUPLICATES.inc()
+        return _duplicate_response(seen)
+    except Exception:
+        await db.rollback()
+        raise
+    for stage, (rows, seconds) in stats.stages.items():
+        metrics.observe_upload_stage(stage, rows, seconds)
+        if seconds > 0:
+            metrics.UPLOAD_STAGE_RATE.set(rows / seconds, stage)
+    return {
+        "message": "files processed", "processed_records": stats.rows, "rows_per_sec": round(stats.rows_per_sec, 1),
+        "skipped_records": stats.skipped, "ingest_id": entry.id,
+    }
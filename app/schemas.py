@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional, Dict, Any, List
 import datetime
 
@@ -30,8 +30,7 @@ class UserOut(BaseModel):
     full_name: Optional[str]
     role: str
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class StudentBase(BaseModel):
     student_id: str
@@ -45,8 +44,7 @@ class StudentOut(StudentBase):
     id: int
     created_at: datetime.datetime
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class StudentRecordIn(BaseModel):
     student_id: str
@@ -66,9 +64,40 @@ class PredictionOut(BaseModel):
     created_at: datetime.datetime
     details: Optional[Dict[str, Any]] = None
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+class JobOut(BaseModel):
+    id: str
+    status: str
+    progress: float
+    total: int
+    done: int
+    created_at: datetime.datetime
+    finished_at: Optional[datetime.datetime] = None
+    error: Optional[str] = None
+    scoring_version: Optional[str] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+class RiskSummaryStudent(BaseModel):
+    student_id: str
+    name: Optional[str] = None
+    risk_score: float
+    risk_label: str
+    created_at: datetime.datetime
+
+class RiskSummaryOut(BaseModel):
+    total: int
+    by_label: Dict[str, int]
+    avg_risk_score: Optional[float] = None
+    avg_components: Dict[str, float]
+    top: List[RiskSummaryStudent]
+    computed_at: datetime.datetime
 
 class UploadResponse(BaseModel):
     message: str
     processed_records: int
+    rows_per_sec: Optional[float] = None
+    skipped_records: int = 0  # unchanged rows, or the whole file when duplicate
+    duplicate: bool = False
+    ingest_id: Optional[int] = None
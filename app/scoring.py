@@ -0,0 +1,180 @@
+"""
+Prediction runs, off the event loop.
+
+predict_risk is CPU-bound (pandas, NumPy, sklearn), so cohorts are split into
+chunks of settings.SCORING_CHUNK_SIZE rows and scored on a bounded
+ProcessPoolExecutor. Only DB reads/writes happen on the event loop.
+"""
+
+import asyncio
+import datetime
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import crud, models, metrics, summary
+from .config import settings
+from .ml_pipeline import predict_risk, prediction_details, scoring_version, model_registry
+
+_executor: Optional[ProcessPoolExecutor] = None
+_workers = 0
+_inflight = 0
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor, _workers
+    if _executor is None:
+        _workers = settings.SCORING_WORKERS or os.cpu_count() or 1
+        # spawn: workers must not inherit the event loop / DB connections of the parent
+        _executor = ProcessPoolExecutor(
+            max_workers=_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _score_chunk(df: pd.DataFrame) -> Tuple[pd.DataFrame, list, dict]:
+    # runs in a worker process; each worker keeps its own cached model.
+    # Stage timings are sent back because metrics recorded here would stay in the worker.
+    timings: dict = {}
+    preds = predict_risk(df, timings)
+    return preds[["risk_score", "risk_label"]], prediction_details(preds), timings
+
+
+async def score_frame(df: pd.DataFrame, on_progress: Optional[Callable[[int], None]] = None) -> Tuple[pd.DataFrame, list]:
+    """Score df across the process pool, chunk by chunk; returns (scores, details) in df order."""
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    size = settings.SCORING_CHUNK_SIZE
+    chunks = [df.iloc[i:i + size] for i in range(0, len(df), size)]
+
+    async def run(chunk: pd.DataFrame):
+        global _inflight
+        _inflight += 1
+        metrics.EXECUTOR_QUEUE_DEPTH.set(max(0, _inflight - _workers), "scoring")
+        try:
+            out = await loop.run_in_executor(executor, _score_chunk, chunk)
+        finally:
+            _inflight -= 1
+            metrics.EXECUTOR_QUEUE_DEPTH.set(max(0, _inflight - _workers), "scoring")
+        metrics.observe_predict_timings(out[2])
+        if on_progress is not None:
+            on_progress(len(chunk))
+        return out
+
+    parts = await asyncio.gather(*(run(c) for c in chunks))
+    scores = pd.concat([p[0] for p in parts], ignore_index=True)
+    details = [d for p in parts for d in p[1]]
+    return scores, details
+
+
+# feature_rows_query columns scoring needs, and how they are held: ids int-coded
+# at the smallest width that fits, features float64 as stored (the rule
+# thresholds compare them exactly; feature_engineer casts for models), dates
+# datetime64. The external student_id and name strings are not loaded.
+ID_COLUMNS = ("student_pk", "record_id")
+FLOAT_COLUMNS = ("attendance", "test_score", "prev_test_score", "attempts")
+
+
+def compact_frame(data, today: Optional[datetime.date] = None) -> pd.DataFrame:
+    """
+    Scoring frame from a column -> values mapping (a DataFrame, or columns of DB
+    rows), with days_past_due as of today. Other columns are dropped.
+    """
+    out = {}
+    for name in ID_COLUMNS:
+        if name in data:
+            out[name] = pd.to_numeric(np.asarray(data[name], dtype=np.int64), downcast="integer")
+    for name in FLOAT_COLUMNS:
+        if name in data:
+            # None becomes NaN in the conversion
+            out[name] = np.asarray(data[name], dtype=np.float64)
+    due = pd.to_datetime(pd.Series(data["fee_due_date"]))
+    out["fee_due_date"] = due.to_numpy()
+    days = (pd.Timestamp(today or datetime.date.today()) - due).dt.days
+    out["days_past_due"] = days.fillna(0).to_numpy(dtype=np.int32)
+    return pd.DataFrame(out)
+
+
+def _dirty_mask(df: pd.DataFrame, watermarks: pd.DataFrame, version: str, full: bool = False) -> np.ndarray:
+    """
+    Students that need scoring: never scored, new latest record, different
+    scoring version, or a fee state that moved with the calendar since scoring
+    (everyone with full=True). A row older than the student's watermark comes
+    from a lagging replica and is never scored, so the current prediction cannot
+    move back to older data; last_record_id only grows as records are ingested.
+    """
+    if watermarks.empty:
+        return np.ones(len(df), dtype=bool)
+    m = df[["student_pk", "record_id", "fee_due_date"]].merge(watermarks, on="student_pk", how="left")
+    behind = m["record_id"] < m["last_record_id"]
+    if full:
+        return (~behind).to_numpy()
+    dirty = m["last_record_id"].isna() | (m["record_id"] > m["last_record_id"]) | (m["scoring_version"] != version)
+    # days_past_due depends on today's date, not only on the stored record
+    today = pd.Timestamp(datetime.date.today())
+    due = pd.to_datetime(m["fee_due_date"])
+    scored_on = pd.to_datetime(m["scored_at"]).dt.normalize()
+    if model_registry.current_label() is None:
+        overdue_days = settings.FEE_DELINQUENT_DAYS
+        dirty |= ((today - due).dt.days > overdue_days) != ((scored_on - due).dt.days > overdue_days)
+    else:
+        dirty |= due.notna() & (scored_on != today)
+    return (dirty & ~behind).to_numpy()
+
+
+async def run_predictions(
+    db: AsyncSession,
+    full: bool = False,
+    on_total: Optional[Callable[[int], None]] = None,
+    on_progress: Optional[Callable[[int], None]] = None,
+    load_results: bool = True,
+    read_db: Optional[AsyncSession] = None,
+) -> Optional[List[models.Prediction]]:
+    """
+    Pull each student's feature row, score the students whose data, model or
+    thresholds changed since their last prediction (everyone when full=True),
+    save the new predictions and return the current prediction of every student
+    (None with load_results=False, for callers that stream them instead).
+    The feature scan goes to read_db (a replica session) when given; watermarks,
+    writes and the returned predictions always use db, the primary.
+    """
+    # same engine (no replica configured): stay on db's connection
+    reader = read_db if read_db is not None and read_db.get_bind() is not db.get_bind() else db
+    # one materialized feature row per student (see feature_store), no history scan
+    # read in partitions, compacting each one, so the DB rows of the whole cohort are never held at once
+    q = crud.feature_rows_query().execution_options(yield_per=settings.SCORING_CHUNK_SIZE)
+    result = await reader.stream(q)
+    keys = list(result.keys())
+    today = datetime.date.today()
+    parts = [compact_frame(dict(zip(keys, zip(*part))), today) async for part in result.partitions()]
+    if not parts:
+        return [] if load_results else None
+    df = pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+    del parts
+    version = scoring_version()
+    if not full or reader is not db:
+        watermarks = pd.DataFrame(await crud.get_watermarks(db), columns=["student_pk", "last_record_id", "scoring_version", "scored_at"])
+        df = df[_dirty_mask(df, watermarks, version, full)].reset_index(drop=True)
+    if on_total is not None:
+        on_total(len(df))
+    if not df.empty:
+        scores, details = await score_frame(df, on_progress)
+        # scores keep df row order, so the internal student pk lines up positionally
+        rows = [
+            {"student_id": int(pk), "risk_score": float(score), "risk_label": label, "details": detail}
+            for pk, score, label, detail in zip(df["student_pk"], scores["risk_score"], scores["risk_label"], details)
+        ]
+        await crud.save_scoring_run(db, rows, df["record_id"].tolist(), version)
+        summary.invalidate()
+    return await crud.current_predictions(db) if load_results else None
@@ -0,0 +1,142 @@
+"""
+Cohort risk summary for dashboards, served from cache.
+
+The summary (counts per risk_label, average score and rule components, top-N
+riskiest students) is aggregated from each student's current prediction and kept
+in an in-process TTLCache. With settings.SUMMARY_CACHE_DIR set it is also written
+there as JSON, so the uvicorn workers on a host compute it once between them.
+
+Entries are keyed by a generation that invalidate() bumps whenever predictions
+are written: an in-process counter, or a small file in SUMMARY_CACHE_DIR whose
+inode changes on every bump. A cached read costs one dict lookup (plus one
+os.stat with the shared directory); the TTL only bounds how long a summary
+computed from a lagging replica can be served.
+"""
+
+import asyncio
+import datetime
+import glob
+import json
+import os
+import time
+import uuid
+from typing import Any, Dict, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import crud
+from .cache import TTLCache
+from .config import settings
+
+# rule penalties (>= 0): ml_pipeline.RULE_COMPONENTS, not imported here to keep the ML stack
+# out of this read path. Model predictions store signed contributions under the same keys;
+# risk_summary_query leaves them out of the averages.
+COMPONENTS = ["attendance_component", "drop_component", "attempts_component", "fee_component"]
+GENERATION_FILE = "generation"
+
+_cache = TTLCache(maxsize=32, ttl=settings.SUMMARY_CACHE_TTL_SECONDS)
+_local_generation = 0
+_lock = asyncio.Lock()
+
+
+def _generation() -> tuple:
+    if not settings.SUMMARY_CACHE_DIR:
+        return (_local_generation,)
+    try:
+        st = os.stat(os.path.join(settings.SUMMARY_CACHE_DIR, GENERATION_FILE))
+    except FileNotFoundError:
+        return (0, 0)
+    return (st.st_ino, st.st_mtime_ns)
+
+
+def invalidate() -> None:
+    """Drop every cached summary, in this process and (if configured) on this host."""
+    global _local_generation
+    _local_generation += 1
+    _cache.clear()
+    cache_dir = settings.SUMMARY_CACHE_DIR
+    if not cache_dir:
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = os.path.join(cache_dir, f".{GENERATION_FILE}.{uuid.uuid4().hex}")
+    with open(tmp, "w") as f:
+        f.write(uuid.uuid4().hex)
+    os.replace(tmp, os.path.join(cache_dir, GENERATION_FILE))
+    for path in glob.glob(os.path.join(cache_dir, "summary-*.json")):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _shared_path(top: int, generation: tuple) -> str:
+    tag = "-".join(str(g) for g in generation)
+    return os.path.join(settings.SUMMARY_CACHE_DIR, f"summary-{top}-{tag}.json")
+
+
+def _read_shared(top: int, generation: tuple) -> Optional[Dict[str, Any]]:
+    if not settings.SUMMARY_CACHE_DIR:
+        return None
+    path = _shared_path(top, generation)
+    try:
+        if os.path.getmtime(path) < time.time() - settings.SUMMARY_CACHE_TTL_SECONDS:
+            return None
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write_shared(top: int, generation: tuple, summary: Dict[str, Any]) -> None:
+    if not settings.SUMMARY_CACHE_DIR:
+        return
+    os.makedirs(settings.SUMMARY_CACHE_DIR, exist_ok=True)
+    path = _shared_path(top, generation)
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(summary, f)
+    os.replace(tmp, path)
+
+
+async def compute_summary(db: AsyncSession, top: int) -> Dict[str, Any]:
+    """Aggregate the current predictions with two queries; the result is JSON-ready."""
+    res = await db.execute(crud.risk_summary_query(COMPONENTS))
+    rows = res.mappings().all()
+    total = sum(r["n"] for r in rows)
+    score_sum = sum(r["score_sum"] or 0.0 for r in rows)
+    components = {}
+    for c in COMPONENTS:
+        n = sum(r[f"{c}_n"] for r in rows)
+        if n:
+            components[c] = sum(r[f"{c}_sum"] or 0.0 for r in rows) / n
+    res = await db.execute(crud.top_risk_query(top))
+    return {
+        "total": total,
+        "by_label": {r["risk_label"]: r["n"] for r in rows},
+        "avg_risk_score": score_sum / total if total else None,
+        "avg_components": components,
+        "top": [
+            {
+                "student_id": r["student_id"], "name": r["name"], "risk_score": r["risk_score"],
+                "risk_label": r["risk_label"], "created_at": r["created_at"].isoformat(),
+            }
+            for r in res.mappings()
+        ],
+        "computed_at": datetime.datetime.utcnow().isoformat(),
+    }
+
+
+async def get_summary(db: AsyncSession, top: int = 10) -> Dict[str, Any]:
+    generation = _generation()
+    key = (top, generation)
+    summary = _cache.get(key)
+    if summary is not None:
+        return summary
+    # one computation per worker at a time; the others wait for its result
+    async with _lock:
+        summary = _cache.get(key)
+        if summary is None:
+            summary = _read_shared(top, generation)
+            if summary is None:
+                summary = await compute_summary(db, top)
+                _write_shared(top, generation, summary)
+            _cache.set(key, summary)
+    return summary
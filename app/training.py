@@ -0,0 +1,219 @@
+"""
+Training pipeline for the risk model.
+
+Labeled rows are built straight from the database (crud.training_rows_query):
+every StudentRecord with the student's previous test score, labeled with the
+risk_label column of the upload when one was given (kept in
+StudentRecord.additional). Otherwise only the record the student's current
+Prediction was computed from is used, with that prediction's label. Forests are fitted on all cores, optionally after a small
+hyperparameter search whose candidates run on a process pool, and every result
+is published as an immutable model version with its feature list, metrics and
+training time. A version only serves traffic once promoted.
+
+    python -m app.training train [--search] [--no-promote]
+    python -m app.training list
+    python -m app.training promote <version>
+    python -m app.training compile <version>
+"""
+
+import argparse
+import asyncio
+import datetime
+import itertools
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+import pandas as pd
+import sklearn
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.model_selection import train_test_split
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import crud
+from .config import settings
+from .ml_pipeline import RISK_LABELS, build_pipeline, feature_engineer, missing_classes, model_registry
+
+LABEL_CODES = {label: i for i, label in enumerate(RISK_LABELS)}
+
+# small grid on purpose: every candidate is a full forest fit
+DEFAULT_GRID = {
+    "n_estimators": [100, 200],
+    "max_depth": [None, 8, 16],
+    "min_samples_leaf": [1, 5],
+}
+
+
+def _upload_label(additional: Any) -> Optional[str]:
+    if isinstance(additional, dict) and additional.get("risk_label") in LABEL_CODES:
+        return additional["risk_label"]
+    return None
+
+
+def labeled_frame(rows: pd.DataFrame) -> Tuple[pd.DataFrame, pd.Series]:
+    """Turn training_rows_query output into (features, class codes), dropping unlabeled rows."""
+    uploaded = pd.Series([_upload_label(a) for a in rows["additional"]], index=rows.index, dtype=object)
+    predicted = uploaded.isna() & rows["predicted_label"].notna()
+    labels = uploaded.where(~predicted, rows["predicted_label"])
+    keep = labels.notna()
+    rows, labels, predicted = rows[keep], labels[keep], predicted[keep]
+    # days past due as of the record's date (today for undated records); a predicted
+    # label was computed on its scoring day, so its features are taken as of then
+    as_of = pd.to_datetime(rows["date"]).fillna(pd.Timestamp(datetime.date.today()))
+    as_of = as_of.where(~predicted, pd.to_datetime(rows["scored_at"]).dt.normalize())
+    rows = rows.assign(days_past_due=(as_of - pd.to_datetime(rows["fee_due_date"])).dt.days.fillna(0).astype(int))
+    X = feature_engineer(rows).reset_index(drop=True)
+    y = labels.map(LABEL_CODES).astype(int).reset_index(drop=True)
+    return X, y
+
+
+async def load_dataset(db: AsyncSession) -> Tuple[pd.DataFrame, pd.Series]:
+    res = await db.execute(crud.training_rows_query())
+    rows = pd.DataFrame(res.all(), columns=list(res.keys()))
+    if rows.empty:
+        return feature_engineer(rows), pd.Series(dtype=int)
+    return labeled_frame(rows)
+
+
+def _evaluate(pipe, X: pd.DataFrame, y: pd.Series) -> Dict[str, float]:
+    pred = pipe.predict(X)
+    return {
+        "accuracy": float(accuracy_score(y, pred)),
+        "f1_macro": float(f1_score(y, pred, average="macro", zero_division=0)),
+    }
+
+
+def _fit_candidate(params: Dict[str, Any], X_train, y_train, X_valid, y_valid) -> Tuple[Dict[str, Any], Dict[str, float]]:
+    # runs in a worker process; one core per candidate, the pool provides the parallelism
+    t0 = time.perf_counter()
+    pipe = build_pipeline(n_jobs=1, **params)
+    pipe.fit(X_train, y_train)
+    scores = _evaluate(pipe, X_valid, y_valid)
+    scores["train_seconds"] = time.perf_counter() - t0
+    return params, scores
+
+
+def search(X_train, y_train, X_valid, y_valid, grid: Dict[str, list], workers: int = 0) -> List[Dict[str, Any]]:
+    """Fit every grid candidate on a process pool; results sorted best first (macro F1)."""
+    candidates = [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+    workers = min(len(candidates), workers or os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [pool.submit(_fit_candidate, c, X_train, y_train, X_valid, y_valid) for c in candidates]
+        results = [{"params": p, **s} for p, s in (f.result() for f in futures)]
+    return sorted(results, key=lambda r: (-r["f1_macro"], -r["accuracy"], r["train_seconds"]))
+
+
+def train(X: pd.DataFrame, y: pd.Series, grid: Optional[Dict[str, list]] = None, workers: int = 0, valid_fraction: float = 0.2):
+    """
+    Pick forest parameters (defaults, or the best of a grid search), score them
+    on a holdout split and refit on all rows. Returns (pipeline, metadata).
+    Fitted on X.to_numpy(), the matrix score_model passes at serving time.
+    """
+    features = list(X.columns)
+    X = X.to_numpy()
+    counts = y.value_counts()
+    if len(counts) < 2 or len(y) < 10:
+        raise ValueError("need at least 10 labeled rows from two or more risk classes")
+    stratify = y if counts.min() >= 2 else None
+    X_train, X_valid, y_train, y_valid = train_test_split(X, y, test_size=valid_fraction, random_state=42, stratify=stratify)
+    t0 = time.perf_counter()
+    candidates = search(X_train, y_train, X_valid, y_valid, grid, workers) if grid else []
+    params = candidates[0]["params"] if candidates else {}
+    pipe = build_pipeline(n_jobs=-1, **params)
+    pipe.fit(X_train, y_train)
+    holdout = _evaluate(pipe, X_valid, y_valid)
+    # the served model sees every labeled row
+    t1 = time.perf_counter()
+    pipe = build_pipeline(n_jobs=-1, **params)
+    pipe.fit(X, y)
+    metadata = {
+        "created_at": datetime.datetime.utcnow().isoformat(),
+        "features": features,
+        "classes": [str(RISK_LABELS[c]) for c in sorted(counts.index)],
+        "params": params,
+        "metrics": holdout,
+        "n_samples": len(X),
+        "n_valid": len(X_valid),
+        "class_counts": {str(RISK_LABELS[c]): int(n) for c, n in counts.items()},
+        "search": candidates,
+        "train_seconds": time.perf_counter() - t1,
+        "total_seconds": time.perf_counter() - t0,
+        "sklearn_version": sklearn.__version__,
+    }
+    return pipe, metadata
+
+
+async def train_from_db(db: AsyncSession, use_search: bool = False, promote: bool = True, workers: int = 0) -> Dict[str, Any]:
+    """
+    Build the dataset, train off the event loop, publish and optionally promote.
+    Raises ValueError before training when promote is set and the labels miss a
+    risk class: a model that can never predict it is not served.
+    """
+    X, y = await load_dataset(db)
+    missing = missing_classes(y.unique())
+    if promote and missing:
+        raise ValueError(f"no {', '.join(missing)} rows to learn from; train with --no-promote to publish anyway")
+    grid = DEFAULT_GRID if use_search else None
+    pipe, metadata = await asyncio.to_thread(train, X, y, grid, workers or settings.TRAINING_WORKERS)
+    version = model_registry.publish(pipe, metadata)
+    if promote:
+        model_registry.promote(version)
+    return dict(metadata, version=version, promoted=promote)
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Train, list and promote risk model versions.")
+    sub = p.add_subparsers(dest="command", required=True)
+    t = sub.add_parser("train", help="train a new version from the database")
+    t.add_argument("--search", action="store_true", help="grid-search forest parameters first")
+    t.add_argument("--no-promote", action="store_true", help="publish without serving it")
+    t.add_argument("--workers", type=int, default=0, help="search processes (default: TRAINING_WORKERS)")
+    sub.add_parser("list", help="list published versions")
+    pr = sub.add_parser("promote", help="serve a published version")
+    pr.add_argument("version")
+    co = sub.add_parser("compile", help="add flat-array forest files to an older version")
+    co.add_argument("version")
+    args = p.parse_args(argv)
+
+    if args.command == "list":
+        current = model_registry.current()
+        for meta in model_registry.versions():
+            marker = "*" if meta["version"] == current else " "
+            m = meta.get("metrics", {})
+            print(f"{marker} {meta['version']}  n={meta.get('n_samples')}  acc={m.get('accuracy', float('nan')):.3f}  f1={m.get('f1_macro', float('nan')):.3f}")
+        return 0
+    if args.command == "compile":
+        if not model_registry.compile(args.version):
+            print(f"{args.version} is not a scaler + forest pipeline, nothing to compile")
+            return 1
+        print(f"compiled {args.version}")
+        return 0
+    if args.command == "promote":
+        missing = missing_classes(model_registry.load(args.version).classes_)
+        if missing:
+            print(f"{args.version} cannot predict {', '.join(missing)}, not promoting it")
+            return 1
+        model_registry.promote(args.version)
+        print(f"serving {args.version}")
+        return 0
+
+    from .database import AsyncSessionLocal
+
+    async def run():
+        async with AsyncSessionLocal() as db:
+            return await train_from_db(db, args.search, not args.no_promote, args.workers)
+
+    try:
+        result = asyncio.run(run())
+    except ValueError as exc:
+        print(exc)
+        return 1
+    m = result["metrics"]
+    state = "promoted" if result["promoted"] else "published"
+    print(f"{state} {result['version']}: acc={m['accuracy']:.3f} f1={m['f1_macro']:.3f} "
+          f"on {result['n_valid']} holdout rows, {result['total_seconds']:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
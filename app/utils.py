@@ -1,33 +1,110 @@
+from __future__ import annotations
 from fastapi import UploadFile, HTTPException
-import pandas as pd
-from typing import Tuple, Dict, Any
-import io
+from typing import Tuple, Dict, Any, Iterator, TYPE_CHECKING
 
-ALLOWED_EXT = {"csv", "xls", "xlsx"}
+if TYPE_CHECKING:
+    import pandas as pd  # imported where used: keeps pandas off the worker startup path
 
-def read_tabular_file(upload_file: UploadFile) -> pd.DataFrame:
-    """Read a CSV/XLS/XLSX file into pandas DataFrame"""
+ARROW_EXT = {"arrow", "feather", "ipc"}
+ALLOWED_EXT = {"csv", "xls", "xlsx", "parquet"} | ARROW_EXT
+
+def _upload_extension(upload_file: UploadFile) -> str:
     filename = upload_file.filename
     if not filename:
         raise HTTPException(status_code=400, detail="File without name uploaded")
     ext = filename.split(".")[-1].lower()
     if ext not in ALLOWED_EXT:
         raise HTTPException(status_code=400, detail="Unsupported file extension")
-    contents = upload_file.file.read()
+    return ext
+
+def _iter_xlsx(fileobj, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Row-stream the first worksheet with openpyxl's read-only mode."""
+    import pandas as pd
+    from openpyxl import load_workbook
+    wb = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            raise ValueError("No columns to parse from file")
+        columns = [c if c is not None else f"Unnamed: {i}" for i, c in enumerate(header)]
+        buf = []
+        for values in rows:
+            if all(v is None for v in values):
+                continue
+            buf.append(values)
+            if len(buf) >= chunk_size:
+                yield pd.DataFrame.from_records(buf, columns=columns)
+                buf = []
+        if buf:
+            yield pd.DataFrame.from_records(buf, columns=columns)
+    finally:
+        wb.close()
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise HTTPException(status_code=400, detail="Parquet/Arrow uploads require pyarrow to be installed")
+    return pyarrow
+
+def _iter_record_batches(batches, chunk_size: int) -> Iterator[pd.DataFrame]:
+    # columnar batches already carry their dtypes; only split oversized ones
+    for batch in batches:
+        for start in range(0, batch.num_rows, chunk_size):
+            yield batch.slice(start, chunk_size).to_pandas()
+
+def _iter_arrow_ipc(fileobj, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Arrow IPC in file (Feather v2) or stream format."""
+    pa = _import_pyarrow()
+    try:
+        reader = pa.ipc.open_file(fileobj)
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+    except pa.ArrowInvalid:
+        fileobj.seek(0)
+        batches = pa.ipc.open_stream(fileobj)
+    yield from _iter_record_batches(batches, chunk_size)
+
+def iter_tabular_file(upload_file: UploadFile, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """
+    Parse a CSV/XLS/XLSX/Parquet/Arrow upload in chunks of at most chunk_size rows, reading
+    straight from the spooled upload file. Peak memory follows chunk_size, not file size.
+    """
+    import pandas as pd
+    ext = _upload_extension(upload_file)
     try:
         if ext == "csv":
-            df = pd.read_csv(io.BytesIO(contents))
+            with pd.read_csv(upload_file.file, chunksize=chunk_size) as reader:
+                yield from reader
+        elif ext == "xlsx":
+            yield from _iter_xlsx(upload_file.file, chunk_size)
+        elif ext == "parquet":
+            pa = _import_pyarrow()
+            yield from _iter_record_batches(pa.parquet.ParquetFile(upload_file.file).iter_batches(batch_size=chunk_size), chunk_size)
+        elif ext in ARROW_EXT:
+            yield from _iter_arrow_ipc(upload_file.file, chunk_size)
         else:
-            # pandas can read excel from bytes buffer
-            df = pd.read_excel(io.BytesIO(contents))
+            # legacy .xls has no streaming reader; slice the parsed sheet instead
+            df = pd.read_excel(upload_file.file)
+            for start in range(0, len(df), chunk_size):
+                yield df.iloc[start:start + chunk_size]
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=422, detail=f"Failed to parse file: {e}")
     finally:
         upload_file.file.close()
-    return df
+
+def read_tabular_file(upload_file: UploadFile) -> pd.DataFrame:
+    """Read a CSV/XLS/XLSX/Parquet/Arrow file into a single pandas DataFrame"""
+    import pandas as pd
+    chunks = list(iter_tabular_file(upload_file, chunk_size=100_000))
+    if not chunks:
+        return pd.DataFrame()
+    return pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
 
 def normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
-    """Lowercase and strip column names to simplify mapping."""
-    df = df.copy()
+    """Lowercase and strip column names (in place) to simplify mapping."""
     df.columns = [str(c).strip().lower() for c in df.columns]
     return df
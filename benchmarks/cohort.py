@@ -0,0 +1,64 @@
+"""
+Synthetic cohort generator for benchmarks.
+
+Produces n students with a weekly record history shaped like the real uploads
+(attendance, test and fee sheets), deterministic for a given seed.
+"""
+
+import datetime
+import os
+from typing import Dict, Iterable, List
+import numpy as np
+import pandas as pd
+
+
+def generate_cohort(n_students: int, records_per_student: int = 3, seed: int = 0,
+                    start: datetime.date = datetime.date(2025, 1, 6)) -> pd.DataFrame:
+    """One row per student per week, all columns the upload path understands."""
+    rng = np.random.default_rng(seed)
+    n = n_students * records_per_student
+    student = np.repeat(np.arange(n_students), records_per_student)
+    week = np.tile(np.arange(records_per_student), n_students)
+    base_attendance = rng.uniform(40, 100, n_students)[student]
+    base_score = rng.uniform(30, 95, n_students)[student]
+    decline = rng.uniform(0, 6, n_students)[student]
+    dates = pd.to_datetime(start) + pd.to_timedelta(week * 7, unit="D")
+    return pd.DataFrame({
+        "student_id": np.char.add("S", np.char.zfill(student.astype(str), 7)),
+        "name": np.char.add("Student ", student.astype(str)),
+        "date": dates.date,
+        "attendance": np.clip(base_attendance + rng.normal(0, 8, n), 0, 100).round(1),
+        "test_score": np.clip(base_score - week * decline + rng.normal(0, 5, n), 0, 100).round(1),
+        "attempts": rng.poisson(1.0, n),
+        "fee_paid": rng.random(n) > 0.15,
+        "fee_due_date": (dates + pd.to_timedelta(rng.integers(-90, 30, n), unit="D")).date,
+    })
+
+
+def split_sheets(cohort: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """The three partial sheets registrars actually send."""
+    return {
+        "attendance": cohort[["student_id", "name", "date", "attendance"]],
+        "tests": cohort[["student_id", "date", "test_score", "attempts"]],
+        "fees": cohort[["student_id", "date", "fee_paid", "fee_due_date"]],
+    }
+
+
+def write_fixtures(cohort: pd.DataFrame, out_dir: str, formats: Iterable[str] = ("csv",)) -> List[str]:
+    """Write the combined sheet and the partial sheets in each format; returns the paths."""
+    os.makedirs(out_dir, exist_ok=True)
+    sheets = {"cohort": cohort, **split_sheets(cohort)}
+    paths = []
+    for fmt in formats:
+        for name, df in sheets.items():
+            path = os.path.join(out_dir, f"{name}.{fmt}")
+            if fmt == "csv":
+                df.to_csv(path, index=False)
+            elif fmt == "xlsx":
+                df.to_excel(path, index=False)
+            elif fmt == "parquet":
+                df.to_parquet(path, index=False)
+            else:
+                raise ValueError(f"unsupported fixture format {fmt}")
+            paths.append(path)
+    return paths
@@ -0,0 +1,109 @@
+"""
+Timing helpers shared by the benchmark scripts.
+"""
+
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from typing import Awaitable, Callable, Dict, List, Optional
+import numpy as np
+
+
+def summarize(samples: List[float], items: int) -> Dict[str, float]:
+    """Latency percentiles (ms) over the samples and throughput (items/s) at the median."""
+    arr = np.asarray(samples, dtype=float)
+    p50 = float(np.percentile(arr, 50))
+    return {
+        "samples": len(samples),
+        "items": items,
+        "p50_ms": p50 * 1000,
+        "p99_ms": float(np.percentile(arr, 99)) * 1000,
+        "mean_ms": float(arr.mean()) * 1000,
+        "throughput_per_s": items / p50 if p50 > 0 else float("inf"),
+    }
+
+
+def time_sync(fn: Callable[[], object], repeat: int, warmup: int = 1,
+              setup: Optional[Callable[[], object]] = None) -> List[float]:
+    for _ in range(warmup):
+        if setup:
+            setup()
+        fn()
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def time_async(fn: Callable[[], Awaitable[object]], repeat: int, warmup: int = 1,
+                     setup: Optional[Callable[[], Awaitable[object]]] = None) -> List[float]:
+    for _ in range(warmup):
+        if setup:
+            await setup()
+        await fn()
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            await setup()
+        start = time.perf_counter()
+        await fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def peak_memory(fn: Callable[[], object]) -> int:
+    """Peak bytes allocated while fn runs (tracemalloc; NumPy reports its buffers to it)."""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def environment() -> Dict[str, str]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": str(os.cpu_count()),
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def save_results(path: str, meta: Dict, results: Dict[str, Dict]) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2, sort_keys=True)
+
+
+def compare(current: Dict[str, Dict], baseline_path: str, tolerance: float) -> List[str]:
+    """Print p50 ratios against a saved run; returns the names that regressed beyond tolerance."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    regressions = []
+    for name, cur in sorted(current.items()):
+        if "p50_ms" not in cur:
+            continue  # memory-only entries
+        base = baseline.get(name)
+        if not base:
+            print(f"{name:<28} (new)")
+            continue
+        ratio = cur["p50_ms"] / base["p50_ms"] if base["p50_ms"] else float("inf")
+        flag = ""
+        if ratio > 1 + tolerance:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<28} {base['p50_ms']:>10.2f} -> {cur['p50_ms']:>10.2f} ms  x{ratio:.2f}{flag}")
+    return regressions
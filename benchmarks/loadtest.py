@@ -0,0 +1,305 @@
+"""
+Mixed-traffic load test of one API worker (app.main), in-process.
+
+    python -m benchmarks.loadtest --concurrency 16 --duration 30
+    python -m benchmarks.loadtest --concurrency 1,4,16,64 --duration 20 --mix login=1,list=8,upload=1,predict=1
+    python -m benchmarks.loadtest --transport uvicorn --output benchmarks/results/load.json
+
+Prepares a throwaway SQLite database with a preloaded cohort and one mentor
+account, then runs --concurrency virtual users against the app for --duration
+seconds per concurrency level. Each user logs in, then loops over requests
+drawn from --mix (relative weights):
+
+- login: POST /auth/token (one bcrypt verify)
+- list: GET /students/?limit=100 with a random keyset cursor
+- summary: GET /students/summary (cached)
+- upload: POST /upload/files with the three partial sheets of a slice of the
+  cohort and a new week of records (pre-generated; the pool is reused once
+  exhausted, which exercises the duplicate-upload path)
+- predict: GET /students/predict?format=ndjson (incremental scoring)
+
+With --transport asgi (default) requests go through httpx's ASGITransport, with
+uvicorn through a uvicorn server started in the same event loop on a local
+port. Either way the app and the load generator share one loop, as a single
+worker would, and a probe task measures event-loop lag (how late a 10 ms sleep
+wakes up). Reports per route: completed requests per second, p50/p95/p99
+latency, and requests shed by admission control (429/503) or failed.
+Increasing --concurrency until throughput stops growing while p99 and lag
+climb gives the saturation point of one worker.
+"""
+
+import argparse
+import asyncio
+import datetime
+import io
+import itertools
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .cohort import generate_cohort, split_sheets
+from .harness import environment, save_results
+
+USERNAME, PASSWORD = "loadtest", "loadtest-password"
+DEFAULT_MIX = "login=1,list=8,summary=2,upload=1,predict=1"
+LAG_INTERVAL = 0.01  # seconds between event-loop lag probes
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--concurrency", default="8", help="virtual users; comma separated to step through levels")
+    p.add_argument("--duration", type=float, default=20.0, help="seconds per concurrency level")
+    p.add_argument("--mix", default=DEFAULT_MIX, help="relative weights of login,list,summary,upload,predict")
+    p.add_argument("--students", type=int, default=2000, help="cohort preloaded before the run")
+    p.add_argument("--upload-students", type=int, default=200, help="students per upload request")
+    p.add_argument("--upload-variants", type=int, default=32, help="distinct upload payloads generated up front")
+    p.add_argument("--transport", choices=("asgi", "uvicorn"), default="asgi")
+    p.add_argument("--bcrypt-rounds", type=int, default=None, help="override BCRYPT_ROUNDS")
+    p.add_argument("--db-url", default=None, help="async SQLAlchemy URL; default is a temporary SQLite file")
+    p.add_argument("--workdir", default=None, help="where the database and the model go")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--output", default=None, help="write results as JSON here")
+    return p.parse_args(argv)
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ACTIONS:
+            raise SystemExit(f"unknown action {name!r} in --mix, expected {', '.join(ACTIONS)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def configure_env(args: argparse.Namespace, workdir: str) -> None:
+    # app settings are read at import time, so this has to run before importing app
+    os.environ["DATABASE_URL"] = args.db_url or f"sqlite+aiosqlite:///{os.path.join(workdir, 'load.db')}"
+    os.environ["MODEL_PATH"] = os.path.join(workdir, "models", "risk_model.joblib")
+    os.environ["AUTO_CREATE_SCHEMA"] = "1"
+    if args.bcrypt_rounds:
+        os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+
+
+def upload_payloads(cohort, n_students: int, variants: int, seed: int) -> List[List[Tuple[str, bytes]]]:
+    """Multi-file uploads: the partial sheets of a slice of students, one new week each."""
+    rng = np.random.default_rng(seed)
+    latest = cohort.groupby("student_id", sort=False).tail(1)
+    payloads = []
+    for v in range(variants):
+        rows = latest.sample(min(n_students, len(latest)), random_state=int(rng.integers(1 << 31))).copy()
+        rows["date"] = rows["date"] + datetime.timedelta(days=7 * (v + 1))
+        rows["attendance"] = np.clip(rows["attendance"] + rng.normal(0, 5, len(rows)), 0, 100).round(1)
+        rows["test_score"] = np.clip(rows["test_score"] + rng.normal(0, 5, len(rows)), 0, 100).round(1)
+        payloads.append([(f"{name}.csv", df.to_csv(index=False).encode()) for name, df in split_sheets(rows).items()])
+    return payloads
+
+
+class Recorder:
+    def __init__(self):
+        self.latency: Dict[str, List[float]] = defaultdict(list)
+        self.status: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+
+    def add(self, route: str, status: int, seconds: float) -> None:
+        self.status[route][status] += 1
+        if status < 400:
+            self.latency[route].append(seconds)
+
+
+async def lag_probe(samples: List[float], stop: asyncio.Event) -> None:
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(LAG_INTERVAL)
+        samples.append(max(0.0, loop.time() - start - LAG_INTERVAL))
+
+
+# --- actions: each returns the route label and response status -----------------
+
+async def do_login(client, state) -> Tuple[str, int]:
+    r = await client.post("/auth/token", json={"username": USERNAME, "password": PASSWORD})
+    if r.status_code == 200:
+        state["headers"] = {"Authorization": f"Bearer {r.json()['access_token']}"}
+    return "POST /auth/token", r.status_code
+
+
+async def do_list(client, state) -> Tuple[str, int]:
+    after = state["rng"].randrange(state["students"])
+    r = await client.get(f"/students/?limit=100&after={after}", headers=state["headers"])
+    return "GET /students/", r.status_code
+
+
+async def do_summary(client, state) -> Tuple[str, int]:
+    r = await client.get("/students/summary", headers=state["headers"])
+    return "GET /students/summary", r.status_code
+
+
+async def do_upload(client, state) -> Tuple[str, int]:
+    payloads = state["payloads"]
+    files = payloads[next(state["upload_counter"]) % len(payloads)]
+    r = await client.post(
+        "/upload/files", headers=state["headers"],
+        files=[("files", (name, data, "text/csv")) for name, data in files],
+    )
+    return "POST /upload/files", r.status_code
+
+
+async def do_predict(client, state) -> Tuple[str, int]:
+    r = await client.get("/students/predict?format=ndjson", headers=state["headers"])
+    return "GET /students/predict", r.status_code
+
+
+ACTIONS = {"login": do_login, "list": do_list, "summary": do_summary, "upload": do_upload, "predict": do_predict}
+
+
+async def user(client, shared: dict, mix: Dict[str, float], deadline: float, recorder: Recorder, seed: int) -> None:
+    state = dict(shared, rng=random.Random(seed), headers={})
+    names, weights = list(mix), list(mix.values())
+    # a session starts with a token; retry while auth sheds load
+    while not state["headers"] and time.perf_counter() < deadline:
+        start = time.perf_counter()
+        route, status = await do_login(client, state)
+        recorder.add(route, status, time.perf_counter() - start)
+        if not state["headers"]:
+            await asyncio.sleep(state["rng"].uniform(0.1, 1.0))
+    while time.perf_counter() < deadline:
+        action = ACTIONS[state["rng"].choices(names, weights)[0]]
+        start = time.perf_counter()
+        try:
+            route, status = await action(client, state)
+        except Exception as e:
+            route, status = f"{action.__name__[3:]} ({type(e).__name__})", 599
+        recorder.add(route, status, time.perf_counter() - start)
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+    p50, p95, p99 = np.percentile(np.asarray(values), [50, 95, 99]) * 1000
+    return {"p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99)}
+
+
+def summarize_level(recorder: Recorder, lag: List[float], seconds: float) -> Dict[str, Dict]:
+    out = {}
+    for route, statuses in sorted(recorder.status.items()):
+        ok = sum(n for s, n in statuses.items() if s < 400)
+        shed = sum(n for s, n in statuses.items() if s in (429, 503))
+        out[route] = {
+            "requests": sum(statuses.values()), "ok": ok, "shed": shed,
+            "errors": sum(statuses.values()) - ok - shed,
+            "throughput_per_s": ok / seconds, **_percentiles(recorder.latency[route]),
+        }
+    lag_ms = np.asarray(lag or [0.0]) * 1000
+    out["event_loop_lag"] = {
+        "samples": len(lag), "p50_ms": float(np.percentile(lag_ms, 50)),
+        "p99_ms": float(np.percentile(lag_ms, 99)), "max_ms": float(lag_ms.max()),
+    }
+    return out
+
+
+def print_level(concurrency: int, result: Dict[str, Dict]) -> None:
+    print(f"\nconcurrency {concurrency}")
+    print(f"  {'route':<24} {'ok/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'shed':>6} {'errors':>6}")
+    fmt = lambda v: f"{v:9.1f}" if v is not None else f"{'-':>9}"
+    for route, r in result.items():
+        if route == "event_loop_lag":
+            continue
+        print(f"  {route:<24} {r['throughput_per_s']:8.1f} {fmt(r['p50_ms'])} {fmt(r['p95_ms'])} {fmt(r['p99_ms'])} {r['shed']:6d} {r['errors']:6d}")
+    lag = result["event_loop_lag"]
+    print(f"  {'event loop lag':<24} {'':>8} {lag['p50_ms']:9.1f} {'':>9} {lag['p99_ms']:9.1f}  max {lag['max_ms']:.1f} ms")
+
+
+async def prepare(client, cohort) -> None:
+    """Create the mentor account and upload the cohort through the API."""
+    r = await client.post("/auth/register", json={"username": USERNAME, "password": PASSWORD, "role": "mentor"})
+    r.raise_for_status()
+    r = await client.post("/auth/token", json={"username": USERNAME, "password": PASSWORD})
+    r.raise_for_status()
+    headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+    buf = io.BytesIO()
+    cohort.to_csv(buf, index=False)
+    r = await client.post("/upload/files", headers=headers, files=[("files", ("cohort.csv", buf.getvalue(), "text/csv"))], timeout=None)
+    r.raise_for_status()
+    r = await client.get("/students/predict?format=ndjson", headers=headers, timeout=None)
+    r.raise_for_status()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Dict]:
+    import httpx
+    from app.main import app
+
+    mix = parse_mix(args.mix)
+    levels = [int(c) for c in str(args.concurrency).split(",") if c]
+    cohort = generate_cohort(args.students, 3, seed=args.seed)
+    shared = {
+        "students": args.students,
+        "payloads": upload_payloads(cohort, args.upload_students, args.upload_variants, args.seed),
+        "upload_counter": itertools.count(),
+    }
+    results: Dict[str, Dict] = {}
+    server_task = None
+    async with app.router.lifespan_context(app):
+        if args.transport == "uvicorn":
+            import uvicorn
+            port = _free_port()
+            server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="off"))
+            server_task = asyncio.create_task(server.serve())
+            while not server.started:
+                await asyncio.sleep(0.01)
+            client_args = {"base_url": f"http://127.0.0.1:{port}"}
+        else:
+            client_args = {"transport": httpx.ASGITransport(app=app), "base_url": "http://loadtest"}
+        limits = httpx.Limits(max_connections=max(levels) + 8, max_keepalive_connections=max(levels) + 8)
+        try:
+            async with httpx.AsyncClient(timeout=120.0, limits=limits, **client_args) as client:
+                await prepare(client, cohort)
+                for concurrency in levels:
+                    recorder, lag, stop = Recorder(), [], asyncio.Event()
+                    probe = asyncio.create_task(lag_probe(lag, stop))
+                    start = time.perf_counter()
+                    deadline = start + args.duration
+                    await asyncio.gather(*(
+                        user(client, shared, mix, deadline, recorder, args.seed * 100003 + i) for i in range(concurrency)
+                    ))
+                    elapsed = time.perf_counter() - start
+                    stop.set()
+                    await probe
+                    results[f"c{concurrency}"] = summarize_level(recorder, lag, elapsed)
+                    print_level(concurrency, results[f"c{concurrency}"])
+        finally:
+            if server_task is not None:
+                server.should_exit = True
+                await server_task
+    return results
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix="load-") as tmp:
+        workdir = args.workdir or tmp
+        os.makedirs(workdir, exist_ok=True)
+        configure_env(args, workdir)
+        results = asyncio.run(run(args))
+    if args.output:
+        meta = {**environment(), "concurrency": args.concurrency, "duration": args.duration, "mix": args.mix,
+                "students": args.students, "transport": args.transport}
+        save_results(args.output, meta, results)
+        print(f"\nresults written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""
+Benchmark suite for the ingest, scoring, predict and auth hot paths.
+
+    python -m benchmarks.run --students 10000 --output benchmarks/results/latest.json
+    python -m benchmarks.run --students 10000 --compare benchmarks/results/baseline.json
+
+Runs against a throwaway SQLite database (aiosqlite) in a temporary directory
+unless --db-url points at another database, e.g. a local Postgres. Each result
+reports p50/p99 latency per sample and throughput (students or rows per second).
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+from typing import Dict
+
+from .cohort import generate_cohort, write_fixtures
+from .harness import summarize, time_sync, time_async, peak_memory, environment, save_results, compare
+
+SUITES = ("ingest", "rules", "model", "predict", "auth")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--students", type=int, default=1000, help="cohort size (1k to 1M)")
+    p.add_argument("--records", type=int, default=3, help="weekly records per student")
+    p.add_argument("--repeat", type=int, default=5, help="timed samples per benchmark")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--suites", default=",".join(SUITES), help=f"comma separated subset of {','.join(SUITES)}")
+    p.add_argument("--formats", default="csv", help="upload fixture formats, e.g. csv,xlsx,parquet")
+    p.add_argument("--db-url", default=None, help="async SQLAlchemy URL; default is a temporary SQLite file")
+    p.add_argument("--bcrypt-rounds", type=int, default=None, help="override BCRYPT_ROUNDS")
+    p.add_argument("--workdir", default=None, help="where fixtures, the database and the model go")
+    p.add_argument("--output", default="benchmarks/results/latest.json")
+    p.add_argument("--compare", default=None, help="previous results file to compare p50 against")
+    p.add_argument("--tolerance", type=float, default=0.10, help="allowed p50 slowdown before flagging")
+    return p.parse_args(argv)
+
+
+def configure_env(args: argparse.Namespace, workdir: str) -> None:
+    # app settings are read at import time, so this has to run before importing app
+    os.environ["DATABASE_URL"] = args.db_url or f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["MODEL_PATH"] = os.path.join(workdir, "models", "risk_model.joblib")
+    if args.bcrypt_rounds:
+        os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+
+
+def scoring_frame(cohort):
+    """
+    Latest row per student with prev_test_score / days_past_due, in the compact
+    form scoring uses (int-coded ids, float64 features).
+    """
+    import numpy as np
+    import pandas as pd
+    from app.scoring import compact_frame
+    ordered = cohort.sort_values(["student_id", "date"])
+    ordered["prev_test_score"] = ordered.groupby("student_id", sort=False)["test_score"].shift(1)
+    frame = ordered.groupby("student_id", sort=False).tail(1).reset_index(drop=True)
+    frame["student_pk"] = pd.factorize(frame["student_id"])[0] + 1
+    frame["record_id"] = np.arange(1, len(frame) + 1)
+    return compact_frame(frame)
+
+
+async def run(args: argparse.Namespace, workdir: str) -> Dict[str, Dict]:
+    from starlette.datastructures import UploadFile
+    from app import models, ml_pipeline, scoring, auth
+    from app.database import engine, AsyncSessionLocal
+    from app.routers import upload_router
+
+    suites = set(args.suites.split(","))
+    formats = [f for f in args.formats.split(",") if f]
+    results: Dict[str, Dict] = {}
+    cohort = generate_cohort(args.students, args.records, seed=args.seed)
+    fixtures = os.path.join(workdir, "fixtures")
+    write_fixtures(cohort, fixtures, formats)
+    n_rows = len(cohort)
+
+    async def reset_schema():
+        async with engine.begin() as conn:
+            await conn.run_sync(models.Base.metadata.drop_all)
+            await conn.run_sync(models.Base.metadata.create_all)
+
+    async def upload(*names: str):
+        files = [open(os.path.join(fixtures, n), "rb") for n in names]
+        try:
+            async with AsyncSessionLocal() as db:
+                await upload_router.upload_files(
+                    files=[UploadFile(file=f, filename=n) for f, n in zip(files, names)], source=None, db=db, token_data=None,
+                )
+        finally:
+            for f in files:
+                f.close()
+
+    def report(name: str, samples, items: int, peak_bytes: int = None) -> None:
+        results[name] = summarize(samples, items)
+        r = results[name]
+        line = f"{name:<28} p50 {r['p50_ms']:>10.2f} ms  p99 {r['p99_ms']:>10.2f} ms  {r['throughput_per_s']:>12.0f}/s"
+        if peak_bytes is not None:
+            r["peak_bytes_per_student"] = peak_bytes / items
+            line += f"  peak {r['peak_bytes_per_student']:>8.0f} B/student"
+        print(line)
+
+    if "ingest" in suites:
+        for fmt in formats:
+            samples = await time_async(lambda: upload(f"cohort.{fmt}"), args.repeat, warmup=0, setup=reset_schema)
+            report(f"ingest_{fmt}", samples, n_rows)
+        samples = await time_async(lambda: upload("attendance.csv", "tests.csv", "fees.csv"), args.repeat, warmup=0, setup=reset_schema)
+        report("ingest_merged_csv", samples, n_rows)
+
+    frame = scoring_frame(cohort)
+    features = ml_pipeline.feature_engineer(frame)
+    frame_bytes = int(frame.memory_usage(deep=True).sum())
+    results["scoring_frame"] = {"items": len(frame), "bytes_per_student": frame_bytes / len(frame)}
+    print(f"{'scoring_frame':<28} {frame_bytes / len(frame):>8.0f} B/student  ({frame_bytes / 2**20:.1f} MiB)")
+    if "rules" in suites:
+        ml_pipeline.model_registry.clear()
+        if os.path.exists(os.environ["MODEL_PATH"]):
+            os.remove(os.environ["MODEL_PATH"])
+        report("score_rules", time_sync(lambda: ml_pipeline.predict_risk(frame), args.repeat), len(frame),
+               peak_memory(lambda: ml_pipeline.predict_risk(frame)))
+
+    if "model" in suites or "predict" in suites:
+        labels = ml_pipeline.score_rules(features)["risk_label"].map({"low": 0, "medium": 1, "high": 2})
+        ml_pipeline.train_model(features, labels)
+    if "model" in suites:
+        report("score_model", time_sync(lambda: ml_pipeline.predict_risk(frame), args.repeat), len(frame),
+               peak_memory(lambda: ml_pipeline.predict_risk(frame)))
+        # score_model adds per-feature explanations; this is the bare model for comparison
+        model, X = ml_pipeline.load_model(), features.to_numpy()
+        report("predict_proba", time_sync(lambda: model.predict_proba(X), args.repeat), len(frame))
+        print(f"{'explanation overhead':<28} x{results['score_model']['p50_ms'] / results['predict_proba']['p50_ms']:.2f} of predict_proba")
+        # one student, as when a mentor opens a single page: served from the compiled forest arrays
+        single = frame.head(1)
+        report("score_model_one_student", time_sync(lambda: ml_pipeline.predict_risk(single), args.repeat * 20), 1)
+
+    if "predict" in suites:
+        await reset_schema()
+        await upload("cohort.csv")
+
+        async def predict(full: bool):
+            async with AsyncSessionLocal() as db:
+                await scoring.run_predictions(db, full=full, load_results=False)
+
+        report("predict_full", await time_async(lambda: predict(True), args.repeat), args.students)
+        report("predict_incremental", await time_async(lambda: predict(False), args.repeat), args.students)
+        scoring.shutdown_executor()
+
+    if "auth" in suites:
+        hashed = auth.hash_password("benchmark-password")
+        report("auth_hash", time_sync(lambda: auth.hash_password("benchmark-password"), args.repeat), 1)
+        report("auth_verify", time_sync(lambda: auth.verify_password("benchmark-password", hashed), args.repeat), 1)
+        n_tokens = 1000
+        tokens = [auth.create_access_token({"sub": f"user{i}", "role": "mentor"}) for i in range(n_tokens)]
+        report("token_issue", time_sync(
+            lambda: [auth.create_access_token({"sub": f"user{i}", "role": "mentor"}) for i in range(n_tokens)], args.repeat), n_tokens)
+
+        async def decode_all():
+            for t in tokens:
+                await auth.get_current_user(token=t)
+
+        async def clear_cache():
+            auth._token_cache.clear()
+
+        report("token_decode_cold", await time_async(decode_all, args.repeat, setup=clear_cache), n_tokens)
+        report("token_decode_cached", await time_async(decode_all, args.repeat), n_tokens)
+
+    await engine.dispose()
+    return results
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix="bench-") as tmp:
+        workdir = args.workdir or tmp
+        configure_env(args, workdir)
+        results = asyncio.run(run(args, workdir))
+    meta = {**environment(), "students": args.students, "records": args.records, "repeat": args.repeat,
+            "db": "sqlite" if not args.db_url else args.db_url.split(":")[0]}
+    save_results(args.output, meta, results)
+    print(f"results written to {args.output}")
+    if args.compare:
+        if compare(results, args.compare, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
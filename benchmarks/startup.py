@@ -0,0 +1,145 @@
+"""
+Startup-time budget for an API worker.
+
+    python -m benchmarks.startup --budget 1.0
+    python -m benchmarks.startup --repeat 5 --bcrypt-rounds 12
+
+Prepares a throwaway SQLite database with one user (python -m app.migrate path),
+then repeatedly spawns a fresh uvicorn process and measures, from spawn:
+
+- import_s: importing app.main in a clean interpreter
+- root_s: first 200 from GET /
+- token_s: first successful POST /auth/token (includes one bcrypt verify)
+
+It also lists heavy modules (pandas, NumPy, sklearn, pyarrow) that importing
+app.main pulled in; there should be none. Exits 1 when the p50 of token_s is
+over --budget seconds.
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+HEAVY_MODULES = ("pandas", "numpy", "sklearn", "scipy", "pyarrow", "openpyxl", "joblib")
+USERNAME, PASSWORD = "startup-bench", "startup-bench-password"
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--repeat", type=int, default=3, help="worker spawns to time")
+    p.add_argument("--budget", type=float, default=1.0, help="allowed p50 seconds from spawn to a token")
+    p.add_argument("--bcrypt-rounds", type=int, default=None, help="override BCRYPT_ROUNDS for the test user")
+    p.add_argument("--timeout", type=float, default=30.0, help="give up on a worker after this many seconds")
+    return p.parse_args(argv)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _request(url: str, body: dict = None) -> int:
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=5) as resp:
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def prepare(env: dict) -> None:
+    """Create the schema and the test user in a separate interpreter."""
+    script = (
+        "import asyncio\n"
+        "from app.database import engine, AsyncSessionLocal\n"
+        "from app.migrate import migrate\n"
+        "from app import auth, crud\n"
+        "from app.schemas import UserCreate\n"
+        "async def main():\n"
+        "    await migrate(engine)\n"
+        "    async with AsyncSessionLocal() as db:\n"
+        f"        user = UserCreate(username={USERNAME!r}, password={PASSWORD!r}, role='mentor')\n"
+        "        await crud.create_user(db, user, auth.hash_password(user.password))\n"
+        "    await engine.dispose()\n"
+        "asyncio.run(main())\n"
+    )
+    subprocess.run([sys.executable, "-c", script], env=env, check=True)
+
+
+def time_import(env: dict) -> dict:
+    script = (
+        "import sys, time, json\n"
+        "t = time.perf_counter()\n"
+        "import app.main\n"
+        "elapsed = time.perf_counter() - t\n"
+        f"print(json.dumps([elapsed, [m for m in {HEAVY_MODULES!r} if m in sys.modules]]))\n"
+    )
+    out = subprocess.run([sys.executable, "-W", "ignore", "-c", script], env=env, check=True, capture_output=True, text=True)
+    elapsed, heavy = json.loads(out.stdout.strip().splitlines()[-1])
+    return {"import_s": elapsed, "heavy_modules": heavy}
+
+
+def time_spawn(env: dict, timeout: float) -> dict:
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    result = {}
+    try:
+        while "root_s" not in result:
+            if time.perf_counter() - start > timeout or proc.poll() is not None:
+                raise RuntimeError("worker did not come up")
+            try:
+                if _request(base + "/") == 200:
+                    result["root_s"] = time.perf_counter() - start
+            except OSError:
+                time.sleep(0.005)
+        status = _request(base + "/auth/token", {"username": USERNAME, "password": PASSWORD})
+        if status != 200:
+            raise RuntimeError(f"/auth/token returned {status}")
+        result["token_s"] = time.perf_counter() - start
+    finally:
+        proc.terminate()
+        proc.wait()
+    return result
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix="startup-")
+    env = dict(os.environ)
+    env["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(workdir, 'startup.db')}"
+    env["MODEL_PATH"] = os.path.join(workdir, "models", "risk_model.joblib")
+    if args.bcrypt_rounds:
+        env["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    prepare(env)
+
+    imp = time_import(env)
+    print(f"import app.main      {imp['import_s'] * 1000:8.1f} ms  heavy modules: {', '.join(imp['heavy_modules']) or 'none'}")
+    runs = [time_spawn(env, args.timeout) for _ in range(args.repeat)]
+    for key in ("root_s", "token_s"):
+        values = [r[key] for r in runs]
+        print(f"spawn -> {key[:-2]:<12} p50 {statistics.median(values) * 1000:8.1f} ms  max {max(values) * 1000:8.1f} ms")
+    p50 = statistics.median(r["token_s"] for r in runs)
+    if p50 > args.budget or imp["heavy_modules"]:
+        print(f"over budget: token p50 {p50:.3f}s (budget {args.budget:.3f}s), heavy modules {imp['heavy_modules']}")
+        return 1
+    print(f"within budget ({args.budget:.3f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
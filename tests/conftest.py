@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+# app settings are read at import time, so point them at a scratch directory first
+_workdir = tempfile.mkdtemp(prefix="app-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{os.path.join(_workdir, 'test.db')}")
+os.environ.setdefault("MODEL_PATH", os.path.join(_workdir, "models", "risk_model.joblib"))
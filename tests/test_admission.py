@@ -0,0 +1,29 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.admission import Limiter
+
+
+def test_acquire_nowait_rejects_when_full_and_frees_on_release():
+    limiter = Limiter("jobs", limit=1, queue=4, timeout=1.0)
+    limiter.acquire_nowait()
+    with pytest.raises(HTTPException) as exc:
+        limiter.acquire_nowait()
+    assert exc.value.status_code == 429
+    assert "Retry-After" in exc.value.headers
+    limiter.release(0.5)
+    limiter.acquire_nowait()
+    assert limiter.active == 1
+
+
+def test_held_slot_queues_request_holders():
+    async def scenario():
+        limiter = Limiter("jobs", limit=1, queue=4, timeout=0.05)
+        limiter.acquire_nowait()
+        with pytest.raises(HTTPException) as exc:
+            await limiter.acquire()
+        assert exc.value.status_code == 503
+
+    asyncio.run(scenario())
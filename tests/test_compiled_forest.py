@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from app.compiled_forest import CompiledForest
+from app.ml_pipeline import CLASS_RISK_WEIGHTS, build_pipeline
+
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.default_rng(1)
+    X = rng.normal(50, 20, (600, 5))
+    y = np.digitize(X[:, 0] + rng.normal(0, 10, len(X)) - X[:, 2] / 2, [30, 55])
+    return X, y
+
+
+@pytest.fixture(scope="module", params=[(0, 1, 2), (0, 2)])
+def pipeline(request, data):
+    X, y = data
+    keep = np.isin(y, request.param)
+    return build_pipeline(n_estimators=25, max_depth=8, min_samples_leaf=2).fit(X[keep], y[keep])
+
+
+@pytest.mark.parametrize("dtype", [np.float64, np.float32])
+def test_predict_proba_matches_pipeline_bit_for_bit(pipeline, data, dtype):
+    X = data[0].astype(dtype)
+    forest = CompiledForest.from_pipeline(pipeline)
+    np.testing.assert_array_equal(forest.predict_proba(X), pipeline.predict_proba(X))
+    np.testing.assert_array_equal(forest.predict(X), pipeline.predict(X))
+
+
+def test_saved_arrays_match_pipeline(pipeline, data, tmp_path):
+    X = data[0]
+    CompiledForest.from_pipeline(pipeline).save(str(tmp_path))
+    forest = CompiledForest.load(str(tmp_path))
+    np.testing.assert_array_equal(forest.predict_proba(X), pipeline.predict_proba(X))
+
+
+@pytest.mark.parametrize("max_rows", [None, 100])
+def test_explain_matches_predict_proba_and_sums_to_score(pipeline, data, max_rows):
+    X = data[0].astype(np.float32)
+    forest = CompiledForest.from_pipeline(pipeline, max_rows=max_rows)
+    weights = CLASS_RISK_WEIGHTS[np.asarray(forest.classes_, dtype=int)]
+    proba, contrib, bias = forest.explain(X, weights)
+    np.testing.assert_array_equal(proba, pipeline.predict_proba(X))
+    assert contrib.shape == X.shape
+    np.testing.assert_allclose(bias + contrib.sum(axis=1), proba @ weights, atol=1e-5)
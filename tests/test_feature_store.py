@@ -0,0 +1,25 @@
+import datetime
+
+from app.feature_store import fold_records
+
+
+def record(id, date, **values):
+    row = {"id": id, "student_id": 1, "date": date, "attendance": None, "test_score": None,
+           "attempts": 0, "fee_paid": True, "fee_due_date": None}
+    row.update(values)
+    return row
+
+
+def test_paying_clears_overdue_fee():
+    due = datetime.date(2024, 1, 1)
+    state = fold_records(None, [record(1, datetime.date(2024, 2, 1), fee_paid=False, fee_due_date=due)])
+    assert (state["fee_paid"], state["fee_due_date"]) == (False, due)
+    state = fold_records(state, [record(2, datetime.date(2024, 3, 1), fee_paid=True)])
+    assert (state["fee_paid"], state["fee_due_date"]) == (True, None)
+
+
+def test_backfill_keeps_latest_fee_state():
+    due = datetime.date(2024, 1, 1)
+    state = fold_records(None, [record(2, datetime.date(2024, 3, 1), fee_paid=False, fee_due_date=due)])
+    state = fold_records(state, [record(3, datetime.date(2024, 2, 1), fee_paid=True)])
+    assert (state["fee_paid"], state["fee_due_date"], state["last_record_id"]) == (False, due, 2)
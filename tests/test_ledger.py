@@ -0,0 +1,20 @@
+import io
+
+from starlette.datastructures import UploadFile
+
+from app.ledger import source_identity
+
+
+def uploads(*names):
+    return [UploadFile(file=io.BytesIO(b""), filename=n) for n in names]
+
+
+def test_default_identity_is_the_file_names():
+    assert source_identity(uploads("Fees.csv", "attendance.csv")) == "attendance.csv,fees.csv"
+
+
+def test_merged_uploads_have_their_own_identity():
+    single = source_identity(uploads("all.csv"), " registrar ")
+    merged = source_identity(uploads("attendance.csv", "tests.csv"), "registrar")
+    assert single == "registrar"
+    assert merged != single and merged.startswith("registrar")
@@ -0,0 +1,49 @@
+import datetime
+
+import pandas as pd
+import pytest
+
+from app.ingest import merge_frames
+
+
+def test_partial_rows_merge_by_student_and_date():
+    attendance = pd.DataFrame({"student_id": ["s1", "s2"], "date": ["2024-01-05", "2024-01-05"], "attendance": [90.0, 70.0]})
+    tests = pd.DataFrame({"student_id": ["s2", "s1"], "date": ["2024-01-05", "2024-01-05"], "test_score": [55.0, 80.0]})
+    merged = merge_frames([attendance, tests]).set_index("student_id")
+    assert len(merged) == 2
+    assert merged.loc["s1", ["attendance", "test_score"]].tolist() == [90.0, 80.0]
+    assert merged.loc["s2", ["attendance", "test_score"]].tolist() == [70.0, 55.0]
+    assert merged.loc["s1", "date"] == datetime.date(2024, 1, 5)
+
+
+def test_files_without_dates_keep_every_row():
+    attendance = pd.DataFrame({"student_id": ["s1", "s1", "s2"], "attendance": [90.0, 80.0, 70.0]})
+    tests = pd.DataFrame({"student_id": ["s1", "s1"], "test_score": [60.0, 50.0]})
+    merged = merge_frames([attendance, tests])
+    assert len(merged) == 3
+    s1 = merged[merged["student_id"] == "s1"]
+    assert s1["attendance"].tolist() == [90.0, 80.0]
+    assert s1["test_score"].tolist() == [60.0, 50.0]
+
+
+def test_repeated_student_day_in_one_file_keeps_both_rows():
+    a = pd.DataFrame({"student_id": ["s1", "s1"], "date": ["2024-01-05", "2024-01-05"], "attendance": [90.0, 80.0]})
+    b = pd.DataFrame({"student_id": ["s1"], "date": ["2024-01-05"], "test_score": [60.0]})
+    merged = merge_frames([a, b])
+    assert merged["attendance"].tolist() == [90.0, 80.0]
+    assert merged["test_score"].iloc[0] == 60.0 and pd.isna(merged["test_score"].iloc[1])
+
+
+def test_mixed_date_formats_parse():
+    a = pd.DataFrame({"student_id": ["s1", "s2"], "date": ["2024-01-05", "2024/01/06"], "attendance": [90.0, 80.0]})
+    b = pd.DataFrame({"student_id": ["s2"], "date": ["2024-01-06"], "test_score": [60.0]})
+    merged = merge_frames([a, b]).set_index("student_id")
+    assert merged.loc["s2", "date"] == datetime.date(2024, 1, 6)
+    assert merged.loc["s2", "test_score"] == 60.0
+
+
+def test_invalid_date_is_reported():
+    a = pd.DataFrame({"student_id": ["s1", "s2"], "date": ["2024-01-05", "not a date"], "attendance": [90.0, 80.0]})
+    b = pd.DataFrame({"student_id": ["s1"], "date": ["2024-01-05"], "test_score": [60.0]})
+    with pytest.raises(ValueError, match=r"attendance\.csv: invalid date 'not a date' in row 2"):
+        merge_frames([a, b], ["attendance.csv", "tests.csv"])
@@ -0,0 +1,33 @@
+import asyncio
+import datetime
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app import models
+from app.migrate import migrate
+
+
+def test_new_feature_table_is_backfilled_from_existing_records(tmp_path):
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'old.db'}")
+        tables = [t for name, t in models.Base.metadata.tables.items() if name != "student_features"]
+        async with engine.begin() as conn:
+            await conn.run_sync(models.Base.metadata.create_all, tables=tables)
+            await conn.execute(insert(models.Student), [{"id": 1, "student_id": "s1"}, {"id": 2, "student_id": "s2"}])
+            await conn.execute(insert(models.StudentRecord), [
+                {"student_id": 1, "date": datetime.date(2024, 1, d), "test_score": 50.0 + d, "attempts": 1, "fee_paid": True}
+                for d in (1, 2)
+            ] + [{"student_id": 2, "date": datetime.date(2024, 1, 1), "test_score": 70.0, "attempts": 0, "fee_paid": True}])
+        created = await migrate(engine)
+        async with engine.connect() as conn:
+            f = models.StudentFeature
+            rows = (await conn.execute(select(f.student_id, f.test_score, f.prev_test_score, f.record_count).order_by(f.student_id))).all()
+        again = await migrate(engine)
+        await engine.dispose()
+        return created, rows, again
+
+    created, rows, again = asyncio.run(run())
+    assert "student_features" in created
+    assert [tuple(r) for r in rows] == [(1, 52.0, 51.0, 2), (2, 70.0, None, 1)]
+    assert again == []
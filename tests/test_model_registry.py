@@ -0,0 +1,16 @@
+import numpy as np
+
+from app.ml_pipeline import build_pipeline
+from app.model_registry import ModelRegistry
+
+
+def test_current_label_does_not_load_the_model(tmp_path):
+    registry = ModelRegistry(str(tmp_path / "risk_model.joblib"))
+    assert registry.current_label() is None
+    X = np.random.default_rng(0).normal(size=(40, 5))
+    version = registry.publish(build_pipeline(n_estimators=3).fit(X, np.arange(40) % 3), {})
+    registry.promote(version)
+    assert registry.current_label() == version
+    assert registry.version is None  # nothing loaded yet
+    registry.get()
+    assert registry.version == registry.current_label() == version
@@ -0,0 +1,63 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.config import settings
+from app.ml_pipeline import FEATURE_COLUMNS, RULE_COMPONENTS, predict_risk, rule_based_score, score_rules
+from app.scoring import compact_frame
+
+
+def reference(features: pd.DataFrame) -> pd.DataFrame:
+    rows = [rule_based_score(row) for _, row in features.iterrows()]
+    return pd.DataFrame(
+        [{"risk_score": s, "risk_label": label, **d} for s, label, d in rows], index=features.index,
+    )
+
+
+def assert_same_scores(out: pd.DataFrame, expected: pd.DataFrame) -> None:
+    assert out["risk_label"].tolist() == expected["risk_label"].tolist()
+    for column in ["risk_score"] + RULE_COMPONENTS:
+        np.testing.assert_array_equal(out[column].to_numpy(), expected[column].to_numpy(), err_msg=column)
+
+
+def test_score_rules_matches_rule_based_score():
+    rng = np.random.default_rng(3)
+    n = 2000
+    features = pd.DataFrame({
+        "attendance": rng.uniform(0, 100, n).round(1),
+        "test_score": rng.uniform(0, 100, n).round(1),
+        "score_drop": rng.uniform(-20, 40, n).round(1),
+        "attempts": rng.integers(0, 8, n).astype(float),
+        "days_past_due": rng.integers(-10, 90, n).astype(float),
+    }, columns=FEATURE_COLUMNS)
+    # exact threshold values
+    features.loc[:9, "attendance"] = settings.ATTENDANCE_THRESHOLD
+    features.loc[10:19, "score_drop"] = settings.TEST_DROP_THRESHOLD
+    features.loc[20:29, "days_past_due"] = settings.FEE_DELINQUENT_DAYS
+    assert_same_scores(score_rules(features), reference(features))
+
+
+@pytest.mark.parametrize("offset", [-0.1, 0.0, 0.1])
+def test_rule_path_keeps_threshold_decisions(offset):
+    # one-decimal score pairs whose drop sits at the threshold, e.g. 16.1 -> 6.1
+    prev = np.round(np.arange(10.0, 100.0, 0.1), 1)
+    test = np.round(prev - settings.TEST_DROP_THRESHOLD + offset, 1)
+    n = len(prev)
+    today = datetime.date(2024, 6, 1)
+    due = [today - datetime.timedelta(days=settings.FEE_DELINQUENT_DAYS + d) for d in (np.arange(n) % 3 - 1).tolist()]
+    raw = pd.DataFrame({
+        "student_pk": np.arange(1, n + 1), "record_id": np.arange(1, n + 1),
+        "attendance": np.round(np.linspace(60, 90, n), 1), "test_score": test,
+        "prev_test_score": prev, "attempts": np.arange(n) % 6, "fee_due_date": due,
+    })
+    # what the per-row path computed from the stored (float64) values
+    expected = reference(pd.DataFrame({
+        "attendance": raw["attendance"].clip(0, 100),
+        "test_score": raw["test_score"].clip(0, 100),
+        "score_drop": raw["prev_test_score"] - raw["test_score"],
+        "attempts": raw["attempts"].astype(float),
+        "days_past_due": [(today - d).days for d in due],
+    }))
+    assert_same_scores(predict_risk(compact_frame(raw, today)), expected)
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app import ml_pipeline
+from app.ml_pipeline import FEATURE_COLUMNS, OTHER_COMPONENT, RULE_COMPONENTS, build_pipeline, missing_classes, prediction_details, score_model
+
+
+def features(n=200, seed=0):
+    rng = np.random.default_rng(seed)
+    X = np.column_stack([
+        rng.uniform(0, 100, n), rng.uniform(0, 100, n), rng.normal(0, 10, n),
+        rng.integers(0, 6, n), rng.integers(0, 90, n),
+    ]).astype(np.float32)
+    return pd.DataFrame(X, columns=FEATURE_COLUMNS)
+
+
+def fitted(X, y):
+    return build_pipeline(n_estimators=10, max_depth=4).fit(X.to_numpy(), y)
+
+
+@pytest.mark.parametrize("classes", [(0, 2), (0, 1), (1, 2)])
+def test_two_class_model_scores_by_class(classes):
+    X = features()
+    y = np.where(X["attendance"] < 50, classes[1], classes[0])
+    model = fitted(X, y)
+    out = score_model(model, X)
+    proba = model.predict_proba(X.to_numpy())
+    weights = ml_pipeline.CLASS_RISK_WEIGHTS[list(classes)]
+    np.testing.assert_allclose(out["risk_score"], proba @ weights)
+    expected = ml_pipeline.RISK_LABELS[np.asarray(classes)[proba.argmax(axis=1)]]
+    assert out["risk_label"].tolist() == expected.tolist()
+    absent = ({0, 1, 2} - set(classes)).pop()
+    assert (out[f"proba_{absent}"] == 0).all()
+    np.testing.assert_allclose(out[[f"proba_{c}" for c in range(3)]].sum(axis=1), 1.0)
+
+
+def test_three_class_score_unchanged():
+    X = features()
+    y = np.digitize(X["attendance"], [33, 66])
+    model = fitted(X, y)
+    proba = model.predict_proba(X.to_numpy())
+    out = score_model(model, X)
+    np.testing.assert_allclose(out["risk_score"], proba[:, 1] * 0.5 + proba[:, 2] * 1.0)
+    assert out["risk_label"].tolist() == ml_pipeline.RISK_LABELS[proba.argmax(axis=1)].tolist()
+
+
+def test_missing_classes():
+    assert missing_classes([0, 1, 2]) == []
+    assert missing_classes(np.array([0, 2])) == ["medium"]
+
+
+def test_train_model_refuses_to_serve_partial_model(monkeypatch):
+    published = []
+    monkeypatch.setattr(ml_pipeline.model_registry, "publish", lambda *a: published.append(a) or "v")
+    X = features()
+    with pytest.raises(ValueError, match="medium"):
+        ml_pipeline.train_model(X, pd.Series(np.where(X["attendance"] < 50, 2, 0)))
+    assert published == []
+
+
+@pytest.mark.parametrize("classes", [(0, 1, 2), (0, 2)])
+def test_contributions_sum_to_risk_score(classes):
+    X = features()
+    y = np.digitize(X["attendance"], [33, 66])
+    keep = np.isin(y, classes)
+    model = fitted(X[keep], y[keep])
+    out = score_model(model, X)
+    contrib = out[RULE_COMPONENTS + [OTHER_COMPONENT]].sum(axis=1)
+    np.testing.assert_allclose(contrib, out["risk_score"], atol=1e-5)
+
+
+def test_model_details_use_the_rule_component_keys():
+    X = features()
+    model = fitted(X, np.digitize(X["attendance"], [33, 66]))
+    out = score_model(model, X.head(3))
+    details = prediction_details(out)
+    for d, score in zip(details, out["risk_score"]):
+        components = {k: v for k, v in d.items() if k != "proba"}
+        assert set(components) == set(RULE_COMPONENTS) | {OTHER_COMPONENT}
+        assert sum(components.values()) == pytest.approx(score, abs=1e-5)
+        assert len(d["proba"]) == 3
@@ -0,0 +1,32 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from app.scoring import _dirty_mask
+
+COLUMNS = ["student_pk", "last_record_id", "scoring_version", "scored_at"]
+
+
+def frame(record_ids):
+    return pd.DataFrame({
+        "student_pk": np.arange(1, len(record_ids) + 1),
+        "record_id": record_ids,
+        "fee_due_date": pd.to_datetime([None] * len(record_ids)),
+    })
+
+
+def test_only_newer_records_are_dirty():
+    now = datetime.datetime.now()
+    watermarks = pd.DataFrame([(1, 10, "v", now), (2, 20, "v", now), (3, 30, "v", now)], columns=COLUMNS)
+    # student 1 has a new record, 2 is unchanged, 3 is read from a replica that lags behind, 4 is new
+    df = frame([11, 20, 29, 40])
+    assert _dirty_mask(df, watermarks, "v").tolist() == [True, False, False, True]
+
+
+def test_stale_rows_are_skipped_on_version_change_and_full_runs():
+    now = datetime.datetime.now()
+    watermarks = pd.DataFrame([(1, 10, "old", now), (2, 20, "old", now)], columns=COLUMNS)
+    df = frame([10, 19])
+    assert _dirty_mask(df, watermarks, "new").tolist() == [True, False]
+    assert _dirty_mask(df, watermarks, "new", full=True).tolist() == [True, False]
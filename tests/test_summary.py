@@ -0,0 +1,38 @@
+import asyncio
+import datetime
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app import models
+from app.summary import compute_summary
+
+
+def test_component_averages_skip_model_predictions(tmp_path):
+    rule = {"attendance_component": 0.2, "drop_component": 0.0, "attempts_component": 0.1, "fee_component": 0.2}
+    model = {"attendance_component": -0.3, "drop_component": 0.05, "attempts_component": -0.1,
+             "fee_component": 0.4, "other_component": 0.35, "proba": [0.2, 0.3, 0.5]}
+
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'summary.db'}")
+        now = datetime.datetime(2024, 1, 1)
+        async with engine.begin() as conn:
+            await conn.run_sync(models.Base.metadata.create_all)
+            await conn.execute(insert(models.Student), [{"id": 1, "student_id": "s1"}, {"id": 2, "student_id": "s2"}])
+            await conn.execute(insert(models.Prediction), [
+                {"id": 1, "student_id": 1, "risk_score": 0.5, "risk_label": "medium", "details": rule, "created_at": now},
+                {"id": 2, "student_id": 2, "risk_score": 0.4, "risk_label": "medium", "details": model, "created_at": now},
+            ])
+            await conn.execute(insert(models.ScoringWatermark), [
+                {"student_id": s, "last_record_id": 1, "scoring_version": "v", "prediction_id": s, "scored_at": now}
+                for s in (1, 2)
+            ])
+        async with AsyncSession(engine) as db:
+            summary = await compute_summary(db, top=5)
+        await engine.dispose()
+        return summary
+
+    summary = asyncio.run(run())
+    assert summary["total"] == 2
+    assert summary["avg_risk_score"] == 0.45
+    assert summary["avg_components"] == rule